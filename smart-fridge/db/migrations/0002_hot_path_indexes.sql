@@ -0,0 +1,23 @@
+CREATE INDEX IF NOT EXISTS idx_items_name ON items(name);
+
+CREATE INDEX IF NOT EXISTS idx_batches_status_expiry
+  ON inventory_batches(status, expire_date IS NULL, expire_date);
+
+CREATE INDEX IF NOT EXISTS idx_batches_location_expiry
+  ON inventory_batches(location, expire_date IS NULL, expire_date);
+
+CREATE INDEX IF NOT EXISTS idx_batches_expiry
+  ON inventory_batches(expire_date IS NULL, expire_date);
+
+CREATE INDEX IF NOT EXISTS idx_events_batch_created
+  ON inventory_events(batch_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_events_created ON inventory_events(created_at);
+
+CREATE INDEX IF NOT EXISTS idx_menu_plans_generated ON menu_plans(generated_at);
+
+CREATE INDEX IF NOT EXISTS idx_menu_plan_items_menu
+  ON menu_plan_items(menu_id, date, meal_type);
+
+CREATE INDEX IF NOT EXISTS idx_shopping_items_menu
+  ON shopping_list_items(menu_id, checked, item_name_snapshot);
@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_batches_status_expire_date
+  ON inventory_batches(status, expire_date);
@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_batches_item_fifo
+  ON inventory_batches(item_id, status, expire_date IS NULL, expire_date);
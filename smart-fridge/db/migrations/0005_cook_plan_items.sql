@@ -0,0 +1,4 @@
+ALTER TABLE menu_plan_items ADD COLUMN cooked_at TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe
+  ON recipe_ingredients(recipe_id, item_id);
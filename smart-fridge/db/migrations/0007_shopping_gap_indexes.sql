@@ -0,0 +1,8 @@
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_item
+  ON recipe_ingredients(item_id, recipe_id);
+
+CREATE INDEX IF NOT EXISTS idx_menu_plan_items_recipe
+  ON menu_plan_items(recipe_id, date);
+
+CREATE INDEX IF NOT EXISTS idx_shopping_items_item
+  ON shopping_list_items(item_id, menu_id);
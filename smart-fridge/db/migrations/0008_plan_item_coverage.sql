@@ -0,0 +1 @@
+ALTER TABLE menu_plan_items ADD COLUMN coverage REAL;
@@ -0,0 +1 @@
+DROP INDEX IF EXISTS idx_batches_status_expire_date;
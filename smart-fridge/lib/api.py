@@ -1,17 +1,36 @@
 from __future__ import annotations
 
+import copy
+import hashlib
+import json
+import os
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import db
-from .utils import add_days, format_date, now_ts, parse_date, today
+from .cache import TTLCache
+from .catalog import get_catalog
+from .circuit_breaker import breaker_stats
+from .http_client import client_stats
+from .menu_engine import refresh_shopping_gaps, save_plan
+from .menu_engine import repair_menu as repair_menu_plan
+from .utils import add_days, format_date, now_ts, today
 from .planner_provider import ProviderNotAvailable as PlannerNotAvailable
-from .planner_provider import get_planner
+from .planner_provider import get_planner, response_cache_stats
 from .vision_provider import ProviderNotAvailable, get_provider
 
 UPLOAD_DIR = Path(__file__).resolve().parents[1] / "data" / "uploads"
 
+MENU_CACHE_SIZE = int(os.getenv("SMART_FRIDGE_MENU_CACHE_SIZE", "32"))
+MENU_CACHE_TTL = float(os.getenv("SMART_FRIDGE_MENU_CACHE_TTL", "600"))
+_menu_cache = TTLCache(MENU_CACHE_SIZE, MENU_CACHE_TTL)
+
+HEDGE_WORKERS = int(os.getenv("SMART_FRIDGE_HEDGE_WORKERS", "4"))
+_hedge_executor = ThreadPoolExecutor(max_workers=max(2, HEDGE_WORKERS), thread_name_prefix="menu-hedge")
+
 
 def ensure_initialized() -> None:
     db.init_db()
@@ -29,11 +48,20 @@ def upload_image(file) -> Dict[str, str]:
     return {"image_id": image_id, "image_path": str(file_path)}
 
 
+def _http_meta(provider: Any) -> Dict[str, Any]:
+    meta = getattr(provider, "http_meta", None)
+    if meta:
+        return meta
+    client = getattr(provider, "client", None)
+    return {"client": client.name, "totals": client.stats()} if client is not None else {}
+
+
 def detect(image_id: str, provider: str = "mock", top_k: int = 12) -> Dict[str, Any]:
     ensure_initialized()
     reason = ""
     used_provider = provider
     degraded = False
+    vision = None
     try:
         vision = get_provider(provider)
         detections = vision.detect(image_id=image_id, top_k=top_k)
@@ -41,14 +69,12 @@ def detect(image_id: str, provider: str = "mock", top_k: int = 12) -> Dict[str,
         reason = f"{exc.code}: {exc.reason}"
         degraded = True
         used_provider = "mock"
-        vision = get_provider("mock")
-        detections = vision.detect(image_id=image_id, top_k=top_k)
+        detections = get_provider("mock").detect(image_id=image_id, top_k=top_k)
     except Exception as exc:  # noqa: BLE001
         reason = f"PROVIDER_ERROR: {exc}"
         degraded = True
         used_provider = "mock"
-        vision = get_provider("mock")
-        detections = vision.detect(image_id=image_id, top_k=top_k)
+        detections = get_provider("mock").detect(image_id=image_id, top_k=top_k)
     return {
         "detections": detections,
         "meta": {
@@ -56,6 +82,8 @@ def detect(image_id: str, provider: str = "mock", top_k: int = 12) -> Dict[str,
             "provider_used": used_provider,
             "degraded": degraded,
             "reason": reason,
+            # On fallback this is still the requested provider, so its failed call is reported.
+            "http": _http_meta(vision),
         },
     }
 
@@ -63,35 +91,37 @@ def detect(image_id: str, provider: str = "mock", top_k: int = 12) -> Dict[str,
 def bulk_create_batches(source: Dict[str, Any], batches: List[Dict[str, Any]]) -> Dict[str, Any]:
     ensure_initialized()
     created = []
-    for batch in batches:
-        batch_id = f"batch_{uuid.uuid4().hex[:8]}"
-        payload = {
-            "batch_id": batch_id,
-            "item_id": batch.get("item_id"),
-            "item_name_snapshot": batch.get("item_name") or batch.get("item_name_snapshot"),
-            "quantity": float(batch.get("quantity", 1)),
-            "unit": batch.get("unit") or "unit",
-            "purchase_date": format_date(today()),
-            "expire_date": batch.get("expire_date") or batch.get("suggest_expire_date"),
-            "location": batch.get("location") or "fridge",
-            "status": "in_stock",
-            "source_type": source.get("type"),
-            "source_ref_id": source.get("image_id"),
-            "created_at": now_ts(),
-            "updated_at": now_ts(),
-        }
-        db.insert_batch(payload)
-        event = {
-            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-            "batch_id": batch_id,
-            "event_type": "create",
-            "delta_quantity": payload["quantity"],
-            "note": "入库创建",
-            "actor": "system",
-            "created_at": now_ts(),
-        }
-        db.insert_event(event)
-        created.append(payload)
+    with db.transaction() as uow:
+        for batch in batches:
+            batch_id = f"batch_{uuid.uuid4().hex[:8]}"
+            payload = {
+                "batch_id": batch_id,
+                "item_id": batch.get("item_id"),
+                "item_name_snapshot": batch.get("item_name") or batch.get("item_name_snapshot"),
+                "quantity": float(batch.get("quantity", 1)),
+                "unit": batch.get("unit") or "unit",
+                "purchase_date": format_date(today()),
+                "expire_date": batch.get("expire_date") or batch.get("suggest_expire_date"),
+                "location": batch.get("location") or "fridge",
+                "status": "in_stock",
+                "source_type": source.get("type"),
+                "source_ref_id": source.get("image_id"),
+                "created_at": now_ts(),
+                "updated_at": now_ts(),
+            }
+            uow.add_batch(payload)
+            event = {
+                "event_id": f"evt_{uuid.uuid4().hex[:8]}",
+                "batch_id": batch_id,
+                "event_type": "create",
+                "delta_quantity": payload["quantity"],
+                "note": "入库创建",
+                "actor": "system",
+                "created_at": now_ts(),
+            }
+            uow.add_event(event)
+            created.append(payload)
+        refresh_shopping_gaps(uow, [batch["item_id"] for batch in created])
     return {"created": created}
 
 
@@ -102,9 +132,10 @@ def list_batches(filters: Dict[str, Any]) -> Dict[str, Any]:
 
 def update_batch(batch_id: str, patch: Dict[str, Any]) -> Dict[str, Any]:
     ensure_initialized()
-    db.update_batch(batch_id, patch)
-    batch = db.get_batch(batch_id)
-    if batch:
+    with db.transaction() as uow:
+        batch = uow.update_batch(batch_id, patch)
+        if not batch:
+            return {}
         event = {
             "event_id": f"evt_{uuid.uuid4().hex[:8]}",
             "batch_id": batch_id,
@@ -114,54 +145,128 @@ def update_batch(batch_id: str, patch: Dict[str, Any]) -> Dict[str, Any]:
             "actor": "user",
             "created_at": now_ts(),
         }
-        db.insert_event(event)
-    return batch or {}
+        uow.add_event(event)
+        if "quantity" in patch or "status" in patch:
+            refresh_shopping_gaps(uow, [batch["item_id"]])
+    return batch
+
+
+def _draw_down(
+    batch_id: str,
+    delta_quantity: float,
+    event_type: str,
+    depleted_status: str,
+    note: str,
+) -> Dict[str, Any]:
+    with db.transaction() as uow:
+        batch = uow.decrement_batch(batch_id, abs(delta_quantity), depleted_status)
+        if not batch:
+            return {}
+        event = {
+            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
+            "batch_id": batch_id,
+            "event_type": event_type,
+            "delta_quantity": -batch["removed"],
+            "note": note,
+            "actor": "user",
+            "created_at": now_ts(),
+        }
+        uow.add_event(event)
+        refresh_shopping_gaps(uow, [batch["item_id"]])
+    return event
 
 
 def consume_batch(batch_id: str, delta_quantity: float, note: str = "") -> Dict[str, Any]:
     ensure_initialized()
-    batch = db.get_batch(batch_id)
-    if not batch:
-        return {}
-    new_qty = max(0.0, float(batch["quantity"]) - delta_quantity)
-    patch = {"quantity": new_qty}
-    if new_qty == 0:
-        patch["status"] = "consumed"
-    db.update_batch(batch_id, patch)
-    event = {
-        "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-        "batch_id": batch_id,
-        "event_type": "consume",
-        "delta_quantity": -abs(delta_quantity),
-        "note": note or "消耗库存",
-        "actor": "user",
-        "created_at": now_ts(),
-    }
-    db.insert_event(event)
-    return event
+    return _draw_down(batch_id, delta_quantity, "consume", "consumed", note or "消耗库存")
 
 
 def discard_batch(batch_id: str, delta_quantity: float, reason: str = "") -> Dict[str, Any]:
     ensure_initialized()
-    batch = db.get_batch(batch_id)
-    if not batch:
-        return {}
-    new_qty = max(0.0, float(batch["quantity"]) - delta_quantity)
-    patch = {"quantity": new_qty}
-    if new_qty == 0:
-        patch["status"] = "discarded"
-    db.update_batch(batch_id, patch)
-    event = {
-        "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-        "batch_id": batch_id,
-        "event_type": "discard",
-        "delta_quantity": -abs(delta_quantity),
-        "note": reason or "丢弃库存",
-        "actor": "user",
-        "created_at": now_ts(),
+    return _draw_down(batch_id, delta_quantity, "discard", "discarded", reason or "丢弃库存")
+
+
+def consume_item(item_id: int, quantity: float, note: str = "") -> Dict[str, Any]:
+    ensure_initialized()
+    events = []
+    with db.transaction() as uow:
+        allocations, shortfall = uow.allocate_fifo(item_id, abs(quantity))
+        for alloc in allocations:
+            event = {
+                "event_id": f"evt_{uuid.uuid4().hex[:8]}",
+                "batch_id": alloc["batch_id"],
+                "event_type": "consume",
+                "delta_quantity": -alloc["quantity"],
+                "note": note or "按食材消耗（先到期先用）",
+                "actor": "user",
+                "created_at": now_ts(),
+            }
+            uow.add_event(event)
+            events.append(event)
+        refresh_shopping_gaps(uow, [item_id])
+    return {
+        "item_id": item_id,
+        "requested": abs(quantity),
+        "consumed": abs(quantity) - shortfall,
+        "shortfall": shortfall,
+        "events": events,
+    }
+
+
+def cook_plan_item(plan_item_id: str) -> Dict[str, Any]:
+    ensure_initialized()
+    events = []
+    shortfall = []
+    with db.transaction() as uow:
+        plan_item = uow.get_plan_item(plan_item_id)
+        if not plan_item:
+            return {}
+        if plan_item.get("cooked_at"):
+            return {
+                "plan_item_id": plan_item_id,
+                "recipe_id": plan_item["recipe_id"],
+                "already_cooked": True,
+                "cooked_at": plan_item["cooked_at"],
+                "events": [],
+                "shortfall": [],
+            }
+        servings = max(1, int(plan_item.get("servings") or 1))
+        requirements = uow.recipe_requirements(plan_item["recipe_id"])
+        for requirement in requirements:
+            need = float(requirement["quantity"]) * servings
+            allocations, missing = uow.allocate_fifo(requirement["item_id"], need)
+            for alloc in allocations:
+                event = {
+                    "event_id": f"evt_{uuid.uuid4().hex[:8]}",
+                    "batch_id": alloc["batch_id"],
+                    "event_type": "consume",
+                    "delta_quantity": -alloc["quantity"],
+                    "note": f"烹饪菜单 {plan_item['date']} {plan_item['meal_type']}",
+                    "actor": "user",
+                    "created_at": now_ts(),
+                }
+                uow.add_event(event)
+                events.append(event)
+            if missing > 0:
+                shortfall.append(
+                    {
+                        "item_id": requirement["item_id"],
+                        "item_name": requirement.get("item_name") or str(requirement["item_id"]),
+                        "need_qty": round(missing, 1),
+                        "unit": requirement["unit"],
+                    }
+                )
+        cooked_at = uow.mark_plan_item_cooked(plan_item_id)
+        refresh_shopping_gaps(uow, [requirement["item_id"] for requirement in requirements])
+    return {
+        "plan_item_id": plan_item_id,
+        "recipe_id": plan_item["recipe_id"],
+        "servings": servings,
+        "already_cooked": False,
+        "cooked_at": cooked_at,
+        "events": events,
+        "shortfall": shortfall,
     }
-    db.insert_event(event)
-    return event
 
 
 def list_events(limit: int = 10) -> Dict[str, Any]:
@@ -176,34 +281,122 @@ def list_batch_events(batch_id: str) -> Dict[str, Any]:
 
 def dashboard_summary() -> Dict[str, Any]:
     ensure_initialized()
-    batches = db.list_batches({})
-    in_stock = [b for b in batches if b["status"] == "in_stock"]
-    expiring = 0
-    for batch in in_stock:
-        if batch.get("expire_date"):
-            days_left = (parse_date(batch["expire_date"]) - today()).days
-            if days_left <= 3:
-                expiring += 1
-    recipes = db.list_recipes()
     return {
-        "kpi_expiring": expiring,
-        "kpi_batches": len(in_stock),
-        "kpi_recipes": len(recipes),
+        "kpi_expiring": db.count_expiring(3),
+        "kpi_batches": db.count_batches("in_stock"),
+        "kpi_recipes": db.count_rows("recipes"),
     }
 
 
 def list_expiring(days: int = 3) -> Dict[str, Any]:
     ensure_initialized()
-    batches = db.list_batches({"status": "in_stock"})
-    upcoming = []
-    for batch in batches:
-        if batch.get("expire_date"):
-            days_left = (parse_date(batch["expire_date"]) - today()).days
-            if days_left <= days:
-                batch = {**batch, "days_left": days_left}
-                upcoming.append(batch)
-    upcoming.sort(key=lambda x: x.get("days_left", 999))
-    return {"batches": upcoming}
+    return {"batches": db.list_expiring(days)}
+
+
+def _menu_fingerprint(days: int, servings: int, constraints: Dict[str, Any], planner: str) -> str:
+    payload = {
+        "db": str(db.DB_PATH),
+        "inventory": db.inventory_state(),
+        "catalog_version": db.get_catalog_version(),
+        "today": format_date(today()),
+        "days": days,
+        "servings": servings,
+        "constraints": constraints,
+        "planner": planner,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def menu_cache_stats() -> Dict[str, Any]:
+    return _menu_cache.stats()
+
+
+def _timed_plan(
+    provider: Any,
+    name: str,
+    timings: Dict[str, Dict[str, float]],
+    submitted: float,
+    days: int,
+    servings: int,
+    constraints: Dict[str, Any],
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    timings[name] = {"queue_ms": round((started - submitted) * 1000, 2)}
+    try:
+        return provider.plan(days, servings, constraints)
+    finally:
+        finished = time.perf_counter()
+        timings[name] = {
+            "queue_ms": round((started - submitted) * 1000, 2),
+            "run_ms": round((finished - started) * 1000, 2),
+            "total_ms": round((finished - submitted) * 1000, 2),
+        }
+
+
+def _configured_planner(name: str, time_budget_ms: Optional[float]) -> Any:
+    provider = get_planner(name)
+    if time_budget_ms is not None and hasattr(provider, "time_budget_ms"):
+        provider.time_budget_ms = time_budget_ms
+    return provider
+
+
+def _hedged_plan(
+    planner: str,
+    days: int,
+    servings: int,
+    constraints: Dict[str, Any],
+    deadline_ms: float,
+    time_budget_ms: Optional[float] = None,
+) -> Tuple[Dict[str, Any], str, str, Dict[str, Any]]:
+    started = time.perf_counter()
+    timings: Dict[str, Dict[str, float]] = {}
+    primary_provider = _configured_planner(planner, time_budget_ms)
+    primary = _hedge_executor.submit(
+        _timed_plan, primary_provider, planner, timings, started, days, servings, constraints
+    )
+    # Greedy runs in the caller thread: slow primaries that outlive their deadline
+    # can occupy every pool worker, and the fallback must not queue behind them.
+    fallback: Optional[Dict[str, Any]] = None
+    fallback_error: Optional[BaseException] = None
+    try:
+        fallback = _timed_plan(get_planner("greedy"), "greedy", timings, time.perf_counter(), days, servings, constraints)
+    except Exception as exc:  # noqa: BLE001
+        fallback_error = exc
+    remaining = max(0.0, deadline_ms / 1000 - (time.perf_counter() - started))
+    done, _ = wait([primary], timeout=remaining)
+    reason = ""
+    if primary in done and primary.exception() is None:
+        draft, used, status = primary.result(), planner, "ok"
+    else:
+        if primary in done:
+            exc = primary.exception()
+            status = "error"
+            if isinstance(exc, PlannerNotAvailable):
+                reason = f"{exc.code}: {exc.reason}"
+            else:
+                reason = f"PLANNER_ERROR: {exc}"
+        else:
+            status = "timeout" if primary.running() else "queued"
+            reason = f"HEDGE_DEADLINE: {planner} did not finish within {deadline_ms:g}ms"
+        if fallback is None:
+            raise fallback_error
+        draft, used = fallback, "greedy"
+        http = _http_meta(primary_provider)
+        if http:
+            draft = {**draft, "meta": {**(draft.get("meta") or {}), "http": http}}
+    hedge = {
+        "deadline_ms": deadline_ms,
+        "winner": used,
+        "primary_status": status,
+        "timings_ms": {
+            # A primary still waiting for a worker has queued for the whole call so far.
+            planner: dict(timings.get(planner) or {"queue_ms": round((time.perf_counter() - started) * 1000, 2)}),
+            "greedy": timings.get("greedy"),
+        },
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    return draft, used, reason, hedge
 
 
 def generate_menu(
@@ -211,35 +404,84 @@ def generate_menu(
     servings: int,
     constraints: Dict[str, Any],
     planner: str = "greedy",
+    use_cache: bool = True,
+    deadline_ms: Optional[float] = None,
+    time_budget_ms: Optional[float] = None,
 ) -> Dict[str, Any]:
     ensure_initialized()
+    fingerprint = _menu_fingerprint(days, servings, constraints, planner) if use_cache else ""
+    if use_cache:
+        cached = _menu_cache.get(fingerprint)
+        if cached is not None:
+            result = copy.deepcopy(cached)
+            result["meta"] = {**result["meta"], "cache": "hit"}
+            return result
     reason = ""
     used_planner = planner
     degraded = False
+    hedge: Dict[str, Any] = {}
+    planner_provider = None
     try:
-        planner_provider = get_planner(planner)
-        result = planner_provider.generate(days, servings, constraints)
+        if deadline_ms is not None and planner != "greedy":
+            draft, used_planner, reason, hedge = _hedged_plan(
+                planner, days, servings, constraints, deadline_ms, time_budget_ms
+            )
+            degraded = used_planner != planner
+            result = save_plan(draft)
+        else:
+            planner_provider = _configured_planner(planner, time_budget_ms)
+            result = planner_provider.generate(days, servings, constraints)
     except PlannerNotAvailable as exc:
         reason = f"{exc.code}: {exc.reason}"
         degraded = True
         used_planner = "greedy"
-        planner_provider = get_planner("greedy")
-        result = planner_provider.generate(days, servings, constraints)
+        result = get_planner("greedy").generate(days, servings, constraints)
     except Exception as exc:  # noqa: BLE001
         reason = f"PLANNER_ERROR: {exc}"
         degraded = True
         used_planner = "greedy"
-        planner_provider = get_planner("greedy")
-        result = planner_provider.generate(days, servings, constraints)
-    return {
+        result = get_planner("greedy").generate(days, servings, constraints)
+    if degraded and not hedge:
+        # planner_provider is still the failed planner here, so its call meta is kept.
+        http = _http_meta(planner_provider)
+        if http:
+            result = {**result, "meta": {**(result.get("meta") or {}), "http": http}}
+    response = {
         **result,
         "meta": {
+            **(result.get("meta") or {}),
             "planner_requested": planner,
             "planner_used": used_planner,
             "degraded": degraded,
             "reason": reason,
+            "cache": "miss" if use_cache else "bypass",
         },
     }
+    if hedge:
+        response["meta"]["hedge"] = hedge
+    # Only budget-independent results are cached, so the search budget stays out of the fingerprint.
+    search = response["meta"].get("search") or {}
+    if use_cache and not degraded and search.get("optimal", True):
+        _menu_cache.put(fingerprint, copy.deepcopy(response))
+    return response
+
+
+def repair_menu(menu_id: str) -> Dict[str, Any]:
+    ensure_initialized()
+    result = repair_menu_plan(menu_id)
+    if result.get("repaired"):
+        # Cached generate_menu responses may carry this menu's pre-repair plan.
+        _menu_cache.clear()
+    return result
+
+
+def http_provider_stats() -> Dict[str, Any]:
+    return {"clients": client_stats(), "circuits": breaker_stats(), "planner_cache": response_cache_stats()}
+
+
+def list_recipe_tags() -> List[str]:
+    ensure_initialized()
+    return sorted(get_catalog().tag_bits)
 
 
 def get_menu(menu_id: str) -> Dict[str, Any]:
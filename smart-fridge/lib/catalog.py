@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+import numpy as np
+
+from . import db
+from .scoring import RecipeMatrix
+from .utils import from_json
+
+
+def _split_csv(value: Optional[str]) -> FrozenSet[str]:
+    return frozenset(part.strip() for part in (value or "").split(",") if part.strip())
+
+
+HIGH_PROTEIN_MIN_G = 20
+LOW_FAT_MAX_G = 10
+LOW_FAT_MAX_CALORIES = 350
+
+DIET_RULES: Dict[str, Callable[[Dict[str, Any], FrozenSet[str]], bool]] = {
+    "high_protein": lambda nutrition, tags: "protein" in tags
+    or float(nutrition.get("protein") or 0) >= HIGH_PROTEIN_MIN_G,
+    "low_fat": lambda nutrition, tags: float(nutrition["fat"]) <= LOW_FAT_MAX_G
+    if nutrition.get("fat") is not None
+    else float(nutrition.get("calories") or 0) <= LOW_FAT_MAX_CALORIES,
+}
+
+
+def _bits_from_positions(positions: List[int], size: int) -> int:
+    mask = np.zeros(size, dtype=np.uint8)
+    mask[positions] = 1
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def _inverted_index(values: List[FrozenSet[str]]) -> Dict[str, int]:
+    positions: Dict[str, List[int]] = {}
+    for pos, keys in enumerate(values):
+        for key in keys:
+            positions.setdefault(key, []).append(pos)
+    return {key: _bits_from_positions(rows, len(values)) for key, rows in positions.items()}
+
+
+class CompiledCatalog:
+    def __init__(
+        self,
+        version: int,
+        path: str,
+        recipes: List[Dict[str, Any]],
+        ingredients: List[Dict[str, Any]],
+        items: List[Dict[str, Any]],
+    ) -> None:
+        self.version = version
+        self.path = path
+        self.recipes = recipes
+        self.recipe_ids = [recipe["recipe_id"] for recipe in recipes]
+        self.recipe_index = {recipe_id: pos for pos, recipe_id in enumerate(self.recipe_ids)}
+        self.recipe_lookup = {recipe["recipe_id"]: recipe for recipe in recipes}
+        self.recipe_map: Dict[int, List[Dict[str, Any]]] = {}
+        for ing in ingredients:
+            self.recipe_map.setdefault(ing["recipe_id"], []).append(ing)
+        self.items = {item["item_id"]: item for item in items}
+        self.allergens = [_split_csv(recipe.get("allergens")) for recipe in recipes]
+        self.tags = [_split_csv(recipe.get("tags")) for recipe in recipes]
+        self.nutrition = {recipe["recipe_id"]: from_json(recipe.get("nutrition_json"), {}) for recipe in recipes}
+        self.matrix = RecipeMatrix(self.recipe_ids, self.recipe_map)
+        self.all_bits = (1 << len(recipes)) - 1
+        self.allergen_bits = _inverted_index(self.allergens)
+        self.tag_bits = _inverted_index(self.tags)
+        self.diet_bits = {
+            diet: _bits_from_positions(
+                [
+                    pos
+                    for pos, recipe_id in enumerate(self.recipe_ids)
+                    if rule(self.nutrition[recipe_id], self.tags[pos])
+                ],
+                len(recipes),
+            )
+            for diet, rule in DIET_RULES.items()
+        }
+
+    def constraint_bits(self, constraints: Dict[str, Any]) -> int:
+        bits = self.all_bits
+        for allergen in constraints.get("allergens_exclude") or []:
+            bits &= ~self.allergen_bits.get(allergen, 0)
+        tags = constraints.get("tags") or []
+        if tags:
+            tagged = 0
+            for tag in tags:
+                tagged |= self.tag_bits.get(tag, 0)
+            bits &= tagged
+        diet_bits = self.diet_bits.get(constraints.get("diet") or "")
+        if diet_bits is not None and bits & diet_bits:
+            bits &= diet_bits
+        return bits
+
+    def rows_from_bits(self, bits: int) -> np.ndarray:
+        n_recipes = len(self.recipe_ids)
+        if n_recipes == 0 or bits == 0:
+            return np.zeros(0, dtype=np.int64)
+        raw = np.frombuffer(bits.to_bytes((n_recipes + 7) // 8, "little"), dtype=np.uint8)
+        mask = np.unpackbits(raw, bitorder="little")[:n_recipes]
+        return np.flatnonzero(mask).astype(np.int64)
+
+
+_catalog: Optional[CompiledCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> CompiledCatalog:
+    global _catalog
+    path = str(db.DB_PATH)
+    version = db.get_catalog_version()
+    cached = _catalog
+    if cached is not None and cached.version == version and cached.path == path:
+        return cached
+    with _catalog_lock:
+        cached = _catalog
+        if cached is not None and cached.version == version and cached.path == path:
+            return cached
+        data = db.load_catalog()
+        _catalog = CompiledCatalog(
+            version=data["version"],
+            path=path,
+            recipes=data["recipes"],
+            ingredients=data["ingredients"],
+            items=data["items"],
+        )
+        return _catalog
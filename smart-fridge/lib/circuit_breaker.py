@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+BREAKER_WINDOW = int(os.getenv("SMART_FRIDGE_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("SMART_FRIDGE_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("SMART_FRIDGE_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("SMART_FRIDGE_BREAKER_COOLDOWN", "30"))
+ADAPTIVE_TIMEOUT_PERCENTILE = 0.95
+ADAPTIVE_TIMEOUT_MULTIPLIER = 3.0
+ADAPTIVE_TIMEOUT_MIN = 1.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, BREAKER_WINDOW))
+        self._latencies: Deque[float] = deque(maxlen=max(1, BREAKER_WINDOW))
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._rejected = 0
+        self._opens = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now - self._opened_at >= BREAKER_COOLDOWN:
+                self.state = HALF_OPEN
+                self._probe_started_at = now
+                return True
+            # A probe that never reported back (e.g. failed before the request) must not wedge the breaker.
+            if self.state == HALF_OPEN and (
+                self._probe_started_at is None or now - self._probe_started_at >= BREAKER_COOLDOWN
+            ):
+                self._probe_started_at = now
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self, latency_s: float) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self._outcomes.clear()
+                self._probe_started_at = None
+            self._outcomes.append(True)
+            self._latencies.append(latency_s)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(False)
+            if len(self._outcomes) >= BREAKER_MIN_CALLS and self._failure_rate() >= BREAKER_FAILURE_RATE:
+                self._trip()
+
+    def _trip(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started_at = None
+        self._opens += 1
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _latency_percentile(self, percentile: float) -> Optional[float]:
+        if len(self._latencies) < BREAKER_MIN_CALLS:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[max(0, math.ceil(percentile * len(ordered)) - 1)]
+
+    def timeout(self, default: float) -> float:
+        with self._lock:
+            observed = self._latency_percentile(ADAPTIVE_TIMEOUT_PERCENTILE)
+        if observed is None:
+            return default
+        return min(default, max(ADAPTIVE_TIMEOUT_MIN, observed * ADAPTIVE_TIMEOUT_MULTIPLIER))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            p95 = self._latency_percentile(0.95)
+            return {
+                "state": self.state,
+                "window": len(self._outcomes),
+                "failure_rate": round(self._failure_rate(), 4),
+                "p95_latency_ms": round(p95 * 1000, 2) if p95 is not None else None,
+                "opens": self._opens,
+                "rejected": self._rejected,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self._outcomes.clear()
+            self._latencies.clear()
+            self._probe_started_at = None
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is not None:
+        return breaker
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name)
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Any]:
+    return {name: breaker.stats() for name, breaker in list(_breakers.items())}
@@ -1,28 +1,251 @@
 from __future__ import annotations
 
+import os
+import queue
+import re
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .utils import DATETIME_FMT, from_json, now_ts, to_json
+from .utils import DATETIME_FMT, format_date, from_json, now_ts, to_json, today
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DB_PATH = BASE_DIR / "data" / "smart_fridge.db"
 SCHEMA_PATH = BASE_DIR / "db" / "schema.sql"
-
-
-def get_connection() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
+MIGRATIONS_DIR = BASE_DIR / "db" / "migrations"
+
+POOL_SIZE = int(os.getenv("SMART_FRIDGE_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("SMART_FRIDGE_DB_POOL_TIMEOUT", "10"))
+BUSY_TIMEOUT = float(os.getenv("SMART_FRIDGE_DB_BUSY_TIMEOUT", "5"))
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class ConnectionPool:
+    def __init__(self, path: Path, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT) -> None:
+        self.path = path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._reused = 0
+        self._waits = 0
+        self._discarded = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # connect(timeout=...) is SQLite's busy timeout (lock waits); self.timeout only bounds pool waits.
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = None
+            reused = False
+        if conn is None:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._waits += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty as exc:
+                    raise sqlite3.OperationalError(
+                        f"Timed out waiting for a database connection ({self.size} in use)"
+                    ) from exc
+                reused = True
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            if reused:
+                self._reused += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False) -> None:
+        with self._lock:
+            self._in_use -= 1
+            if broken:
+                self._created -= 1
+                self._discarded += 1
+        if broken:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "reused": self._reused,
+                "waits": self._waits,
+                "discarded": self._discarded,
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool() -> ConnectionPool:
+    key = str(DB_PATH)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(Path(DB_PATH))
+                _pools[key] = pool
+    return pool
+
+
+@contextmanager
+def get_connection() -> Iterator[sqlite3.Connection]:
+    pool = _get_pool()
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+        if conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            broken = True
+        raise
+    finally:
+        pool.release(conn, broken=broken)
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+def close_connections() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+_initialized: set = set()
+_init_lock = threading.Lock()
+_MIGRATION_NAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+def list_migrations() -> List[Dict[str, Any]]:
+    migrations = [{"version": 1, "name": "schema", "path": SCHEMA_PATH}]
+    if MIGRATIONS_DIR.exists():
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            match = _MIGRATION_NAME.match(path.name)
+            if not match:
+                continue
+            migrations.append({"version": int(match.group(1)), "name": match.group(2), "path": path})
+    migrations.sort(key=lambda m: m["version"])
+    return migrations
+
+
+def schema_version() -> int:
+    row = fetch_one("SELECT MAX(version) AS version FROM schema_version")
+    return int(row["version"] or 0) if row else 0
+
+
+def _split_statements(sql: str) -> List[str]:
+    statements: List[str] = []
+    buffer = ""
+    for line in sql.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+
+def migrate() -> List[int]:
+    applied: List[int] = []
+    with get_connection() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+              version INTEGER PRIMARY KEY,
+              name TEXT NOT NULL,
+              applied_at TEXT NOT NULL
+            )
+            """
+        )
+        for migration in list_migrations():
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+            if migration["version"] <= int(row[0] or 0):
+                conn.rollback()
+                continue
+            sql = migration["path"].read_text(encoding="utf-8")
+            for statement in _split_statements(sql):
+                conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_version(version, name, applied_at) VALUES (?, ?, ?)",
+                (migration["version"], migration["name"], now_ts()),
+            )
+            conn.commit()
+            applied.append(migration["version"])
+    return applied
 
 
 def init_db() -> None:
-    schema_sql = SCHEMA_PATH.read_text(encoding="utf-8")
-    with get_connection() as conn:
-        conn.executescript(schema_sql)
+    key = str(DB_PATH)
+    if key in _initialized:
+        return
+    with _init_lock:
+        if key in _initialized:
+            return
+        migrate()
+        _initialized.add(key)
 
 
 def fetch_all(query: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
@@ -40,13 +263,11 @@ def fetch_one(query: str, params: Iterable[Any] = ()) -> Optional[Dict[str, Any]
 def execute(query: str, params: Iterable[Any] = ()) -> None:
     with get_connection() as conn:
         conn.execute(query, params)
-        conn.commit()
 
 
 def execute_many(query: str, params_list: Iterable[Iterable[Any]]) -> None:
     with get_connection() as conn:
         conn.executemany(query, params_list)
-        conn.commit()
 
 
 def upsert_image(image_id: str, file_path: str) -> None:
@@ -68,8 +289,34 @@ def get_item_by_name(name: str) -> Optional[Dict[str, Any]]:
     return fetch_one("SELECT * FROM items WHERE name = ?", (name,))
 
 
+def _write_catalog(query: str, params_list: Iterable[Iterable[Any]]) -> None:
+    with get_connection() as conn:
+        conn.executemany(query, params_list)
+        conn.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+
+
+def get_catalog_version() -> int:
+    row = fetch_one("SELECT version FROM catalog_version WHERE id = 1")
+    return int(row["version"]) if row else 0
+
+
+def load_catalog() -> Dict[str, Any]:
+    with get_connection() as conn:
+        conn.execute("BEGIN")
+        row = conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()
+        recipes = conn.execute("SELECT * FROM recipes ORDER BY recipe_id").fetchall()
+        ingredients = conn.execute("SELECT * FROM recipe_ingredients").fetchall()
+        items = conn.execute("SELECT * FROM items ORDER BY name").fetchall()
+        return {
+            "version": int(row["version"]) if row else 0,
+            "recipes": [dict(r) for r in recipes],
+            "ingredients": [dict(r) for r in ingredients],
+            "items": [dict(r) for r in items],
+        }
+
+
 def insert_items(items: List[Dict[str, Any]]) -> None:
-    execute_many(
+    _write_catalog(
         "INSERT INTO items(name, category, default_unit, shelf_life_days_default) VALUES (?, ?, ?, ?)",
         [
             (
@@ -84,7 +331,7 @@ def insert_items(items: List[Dict[str, Any]]) -> None:
 
 
 def insert_recipes(recipes: List[Dict[str, Any]]) -> None:
-    execute_many(
+    _write_catalog(
         "INSERT INTO recipes(name, tags, allergens, steps, nutrition_json) VALUES (?, ?, ?, ?, ?)",
         [
             (
@@ -100,7 +347,7 @@ def insert_recipes(recipes: List[Dict[str, Any]]) -> None:
 
 
 def insert_recipe_ingredients(ingredients: List[Dict[str, Any]]) -> None:
-    execute_many(
+    _write_catalog(
         "INSERT INTO recipe_ingredients(recipe_id, item_id, quantity, unit, optional) VALUES (?, ?, ?, ?, ?)",
         [
             (
@@ -123,33 +370,279 @@ def list_recipe_ingredients() -> List[Dict[str, Any]]:
     return fetch_all("SELECT * FROM recipe_ingredients")
 
 
-def insert_batch(batch: Dict[str, Any]) -> None:
-    execute(
-        """
-        INSERT INTO inventory_batches(
-            batch_id, item_id, item_name_snapshot, quantity, unit, purchase_date,
-            expire_date, location, status, source_type, source_ref_id, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            batch["batch_id"],
-            batch.get("item_id"),
-            batch["item_name_snapshot"],
-            batch["quantity"],
-            batch["unit"],
-            batch.get("purchase_date"),
-            batch.get("expire_date"),
-            batch.get("location"),
-            batch.get("status", "in_stock"),
-            batch.get("source_type"),
-            batch.get("source_ref_id"),
-            batch.get("created_at"),
-            batch.get("updated_at"),
-        ),
+BATCH_INSERT_SQL = """
+INSERT INTO inventory_batches(
+    batch_id, item_id, item_name_snapshot, quantity, unit, purchase_date,
+    expire_date, location, status, source_type, source_ref_id, created_at, updated_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+EVENT_INSERT_SQL = (
+    "INSERT INTO inventory_events(event_id, batch_id, event_type, delta_quantity, note, actor, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _batch_row(batch: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        batch["batch_id"],
+        batch.get("item_id"),
+        batch["item_name_snapshot"],
+        batch["quantity"],
+        batch["unit"],
+        batch.get("purchase_date"),
+        batch.get("expire_date"),
+        batch.get("location"),
+        batch.get("status", "in_stock"),
+        batch.get("source_type"),
+        batch.get("source_ref_id"),
+        batch.get("created_at"),
+        batch.get("updated_at"),
     )
 
 
-def update_batch(batch_id: str, patch: Dict[str, Any]) -> None:
+def _event_row(event: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        event["event_id"],
+        event["batch_id"],
+        event["event_type"],
+        event.get("delta_quantity"),
+        event.get("note"),
+        event.get("actor"),
+        event["created_at"],
+    )
+
+
+class UnitOfWork:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self._batches: List[Tuple[Any, ...]] = []
+        self._events: List[Tuple[Any, ...]] = []
+
+    def execute(self, query: str, params: Iterable[Any] = ()) -> sqlite3.Cursor:
+        return self.conn.execute(query, params)
+
+    def add_batch(self, batch: Dict[str, Any]) -> None:
+        self._batches.append(_batch_row(batch))
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        self._events.append(_event_row(event))
+
+    def update_batch(self, batch_id: str, patch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        query, values = _batch_update(batch_id, patch)
+        row = self.conn.execute(f"{query} RETURNING *", values).fetchone()
+        return dict(row) if row else None
+
+    def decrement_batch(self, batch_id: str, quantity: float, depleted_status: str) -> Optional[Dict[str, Any]]:
+        # The IMMEDIATE transaction holds the write lock, so the quantity read here
+        # is the one the UPDATE applies to.
+        row = self.conn.execute(
+            "SELECT quantity FROM inventory_batches WHERE batch_id = ? AND status = 'in_stock'",
+            (batch_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        removed = min(float(quantity), float(row["quantity"]))
+        rows = self.conn.execute(
+            """
+            UPDATE inventory_batches
+            SET quantity = max(0, quantity - ?),
+                status = CASE WHEN quantity - ? <= 0 THEN ? ELSE status END,
+                updated_at = ?
+            WHERE batch_id = ? AND status = 'in_stock'
+            RETURNING *
+            """,
+            (removed, removed, depleted_status, now_ts(), batch_id),
+        ).fetchall()
+        if not rows:
+            return None
+        return {**dict(rows[0]), "removed": removed}
+
+    def allocate_fifo(
+        self,
+        item_id: int,
+        quantity: float,
+        depleted_status: str = "consumed",
+    ) -> Tuple[List[Dict[str, Any]], float]:
+        allocations: List[Dict[str, Any]] = []
+        remaining = float(quantity)
+        cursor = self.conn.execute(
+            """
+            SELECT batch_id, quantity, unit FROM inventory_batches
+            WHERE item_id = ? AND status = 'in_stock'
+            ORDER BY expire_date IS NULL, expire_date
+            """,
+            (item_id,),
+        )
+        for row in cursor:
+            if remaining <= 0:
+                break
+            available = float(row["quantity"])
+            take = min(available, remaining)
+            if take <= 0:
+                continue
+            remaining -= take
+            allocations.append(
+                {
+                    "batch_id": row["batch_id"],
+                    "quantity": take,
+                    "unit": row["unit"],
+                    "remaining": available - take,
+                }
+            )
+        cursor.close()
+        if allocations:
+            updated_at = now_ts()
+            self.conn.executemany(
+                "UPDATE inventory_batches SET quantity = ?, status = ?, updated_at = ? WHERE batch_id = ?",
+                [
+                    (
+                        alloc["remaining"],
+                        depleted_status if alloc["remaining"] <= 0 else "in_stock",
+                        updated_at,
+                        alloc["batch_id"],
+                    )
+                    for alloc in allocations
+                ],
+            )
+        return allocations, max(0.0, remaining)
+
+    def get_plan_item(self, plan_item_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            """
+            SELECT mpi.*, mp.servings FROM menu_plan_items mpi
+            JOIN menu_plans mp ON mp.menu_id = mpi.menu_id
+            WHERE mpi.id = ?
+            """,
+            (plan_item_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def recipe_requirements(self, recipe_id: int) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            """
+            SELECT ri.item_id, SUM(ri.quantity) AS quantity, MIN(ri.unit) AS unit, i.name AS item_name
+            FROM recipe_ingredients ri
+            LEFT JOIN items i ON i.item_id = ri.item_id
+            WHERE ri.recipe_id = ? AND ri.optional = 0
+            GROUP BY ri.item_id
+            """,
+            (recipe_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_plan_item_cooked(self, plan_item_id: str) -> str:
+        cooked_at = now_ts()
+        self.conn.execute("UPDATE menu_plan_items SET cooked_at = ? WHERE id = ?", (cooked_at, plan_item_id))
+        return cooked_at
+
+    def replace_plan_item(
+        self,
+        plan_item_id: str,
+        recipe_id: int,
+        explain: List[str],
+        nutrition: Dict[str, Any],
+        coverage: float,
+    ) -> None:
+        self.conn.execute(
+            """
+            UPDATE menu_plan_items
+            SET recipe_id = ?, explain_json = ?, nutrition_json = ?, coverage = ?
+            WHERE id = ? AND cooked_at IS NULL
+            """,
+            (recipe_id, to_json(explain), to_json(nutrition), coverage, plan_item_id),
+        )
+
+    def open_plan_ingredients(self, item_ids: List[int], reference: str) -> List[Dict[str, Any]]:
+        marks = ", ".join("?" for _ in item_ids)
+        rows = self.conn.execute(
+            f"""
+            SELECT mpi.menu_id, mp.servings, ri.item_id, ri.quantity, ri.optional
+            FROM recipe_ingredients ri
+            JOIN menu_plan_items mpi ON mpi.recipe_id = ri.recipe_id
+            JOIN menu_plans mp ON mp.menu_id = mpi.menu_id
+            WHERE ri.item_id IN ({marks}) AND mpi.cooked_at IS NULL AND mpi.date >= ?
+            """,
+            (*item_ids, reference),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stock_by_item(self, item_ids: List[int]) -> Dict[int, float]:
+        marks = ", ".join("?" for _ in item_ids)
+        return {
+            row["item_id"]: float(row["quantity"])
+            for row in self.conn.execute(
+                f"""
+                SELECT item_id, TOTAL(quantity) AS quantity FROM inventory_batches
+                WHERE item_id IN ({marks}) AND status = 'in_stock'
+                GROUP BY item_id
+                """,
+                item_ids,
+            )
+        }
+
+    def open_shopping_items(self, item_ids: List[int], reference: str) -> List[Dict[str, Any]]:
+        marks = ", ".join("?" for _ in item_ids)
+        rows = self.conn.execute(
+            f"""
+            SELECT s.id, s.menu_id, s.item_id, s.need_qty FROM shopping_list_items s
+            WHERE s.item_id IN ({marks}) AND EXISTS (
+              SELECT 1 FROM menu_plan_items mpi
+              WHERE mpi.menu_id = s.menu_id AND mpi.cooked_at IS NULL AND mpi.date >= ?
+            )
+            """,
+            (*item_ids, reference),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def items_by_id(self, item_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        marks = ", ".join("?" for _ in item_ids)
+        return {
+            row["item_id"]: dict(row)
+            for row in self.conn.execute(
+                f"SELECT item_id, name, default_unit FROM items WHERE item_id IN ({marks})",
+                item_ids,
+            )
+        }
+
+    def update_shopping_items(self, updates: List[Tuple[float, Dict[str, Any], str]]) -> None:
+        if updates:
+            self.conn.executemany(
+                "UPDATE shopping_list_items SET need_qty = ?, reason_json = ? WHERE id = ?",
+                [(need_qty, to_json(reason), item_id) for need_qty, reason, item_id in updates],
+            )
+
+    def add_shopping_items(self, items: List[Dict[str, Any]]) -> None:
+        if items:
+            self.conn.executemany(SHOPPING_INSERT_SQL, [_shopping_row(item) for item in items])
+
+    def delete_shopping_items(self, item_ids: List[str]) -> None:
+        if item_ids:
+            self.conn.executemany("DELETE FROM shopping_list_items WHERE id = ?", [(item_id,) for item_id in item_ids])
+
+    def flush(self) -> None:
+        if self._batches:
+            self.conn.executemany(BATCH_INSERT_SQL, self._batches)
+            self._batches = []
+        if self._events:
+            self.conn.executemany(EVENT_INSERT_SQL, self._events)
+            self._events = []
+
+
+@contextmanager
+def transaction() -> Iterator[UnitOfWork]:
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        uow = UnitOfWork(conn)
+        yield uow
+        uow.flush()
+
+
+def insert_batch(batch: Dict[str, Any]) -> None:
+    execute(BATCH_INSERT_SQL, _batch_row(batch))
+
+
+def _batch_update(batch_id: str, patch: Dict[str, Any]) -> Tuple[str, List[Any]]:
     fields = []
     values: List[Any] = []
     for key, value in patch.items():
@@ -158,7 +651,11 @@ def update_batch(batch_id: str, patch: Dict[str, Any]) -> None:
     fields.append("updated_at = ?")
     values.append(now_ts())
     values.append(batch_id)
-    query = f"UPDATE inventory_batches SET {', '.join(fields)} WHERE batch_id = ?"
+    return f"UPDATE inventory_batches SET {', '.join(fields)} WHERE batch_id = ?", values
+
+
+def update_batch(batch_id: str, patch: Dict[str, Any]) -> None:
+    query, values = _batch_update(batch_id, patch)
     execute(query, values)
 
 
@@ -186,18 +683,7 @@ def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
 
 
 def insert_event(event: Dict[str, Any]) -> None:
-    execute(
-        "INSERT INTO inventory_events(event_id, batch_id, event_type, delta_quantity, note, actor, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (
-            event["event_id"],
-            event["batch_id"],
-            event["event_type"],
-            event.get("delta_quantity"),
-            event.get("note"),
-            event.get("actor"),
-            event["created_at"],
-        ),
-    )
+    execute(EVENT_INSERT_SQL, _event_row(event))
 
 
 def list_events(limit: int = 10) -> List[Dict[str, Any]]:
@@ -215,13 +701,58 @@ def list_batch_events(batch_id: str) -> List[Dict[str, Any]]:
 
 
 def list_expiring(days: int) -> List[Dict[str, Any]]:
+    # (expire_date IS NULL) = 0 matches the expression column of idx_batches_status_expiry,
+    # so the window is a range search on that index rather than a separate one.
+    reference = format_date(today())
     return fetch_all(
         """
-        SELECT * FROM inventory_batches
-        WHERE status = 'in_stock' AND expire_date IS NOT NULL
+        SELECT *, CAST(julianday(expire_date) - julianday(?) AS INTEGER) AS days_left
+        FROM inventory_batches
+        WHERE status = 'in_stock' AND (expire_date IS NULL) = 0 AND expire_date <= date(?, ?)
         ORDER BY expire_date
+        """,
+        (reference, reference, f"+{int(days)} day"),
+    )
+
+
+def count_expiring(days: int) -> int:
+    reference = format_date(today())
+    row = fetch_one(
         """
+        SELECT COUNT(*) AS count FROM inventory_batches
+        WHERE status = 'in_stock' AND (expire_date IS NULL) = 0 AND expire_date <= date(?, ?)
+        """,
+        (reference, f"+{int(days)} day"),
     )
+    return int(row["count"]) if row else 0
+
+
+def inventory_state() -> List[Tuple[Any, ...]]:
+    with get_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT batch_id, item_id, quantity, expire_date FROM inventory_batches
+            WHERE status = 'in_stock' ORDER BY batch_id
+            """
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+
+def inventory_by_item() -> List[Dict[str, Any]]:
+    return fetch_all(
+        """
+        SELECT item_id, TOTAL(quantity) AS quantity, MIN(expire_date) AS earliest_expire, COUNT(*) AS batches
+        FROM inventory_batches
+        WHERE status = 'in_stock' AND item_id IS NOT NULL
+        GROUP BY item_id
+        ORDER BY item_id
+        """
+    )
+
+
+def count_batches(status: str) -> int:
+    row = fetch_one("SELECT COUNT(*) AS count FROM inventory_batches WHERE status = ?", (status,))
+    return int(row["count"]) if row else 0
 
 
 def insert_menu_plan(menu_id: str, days: int, servings: int, constraints: Dict[str, Any]) -> None:
@@ -233,7 +764,7 @@ def insert_menu_plan(menu_id: str, days: int, servings: int, constraints: Dict[s
 
 def insert_menu_plan_items(items: List[Dict[str, Any]]) -> None:
     execute_many(
-        "INSERT INTO menu_plan_items(id, menu_id, date, meal_type, recipe_id, explain_json, nutrition_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        "INSERT INTO menu_plan_items(id, menu_id, date, meal_type, recipe_id, explain_json, nutrition_json, coverage) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
         [
             (
                 item["id"],
@@ -243,31 +774,36 @@ def insert_menu_plan_items(items: List[Dict[str, Any]]) -> None:
                 item["recipe_id"],
                 to_json(item.get("explain") or []),
                 to_json(item.get("nutrition") or {}),
+                item.get("coverage"),
             )
             for item in items
         ],
     )
 
 
-def insert_shopping_items(items: List[Dict[str, Any]]) -> None:
-    execute_many(
-        "INSERT INTO shopping_list_items(id, menu_id, item_id, item_name_snapshot, need_qty, unit, reason_json, checked) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        [
-            (
-                item["id"],
-                item["menu_id"],
-                item.get("item_id"),
-                item["item_name_snapshot"],
-                item["need_qty"],
-                item["unit"],
-                to_json(item.get("reason") or {}),
-                1 if item.get("checked") else 0,
-            )
-            for item in items
-        ],
+SHOPPING_INSERT_SQL = (
+    "INSERT INTO shopping_list_items(id, menu_id, item_id, item_name_snapshot, need_qty, unit, reason_json, checked) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _shopping_row(item: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        item["id"],
+        item["menu_id"],
+        item.get("item_id"),
+        item["item_name_snapshot"],
+        item["need_qty"],
+        item["unit"],
+        to_json(item.get("reason") or {}),
+        1 if item.get("checked") else 0,
     )
 
 
+def insert_shopping_items(items: List[Dict[str, Any]]) -> None:
+    execute_many(SHOPPING_INSERT_SQL, [_shopping_row(item) for item in items])
+
+
 def get_menu(menu_id: str) -> Optional[Dict[str, Any]]:
     plan = fetch_one("SELECT * FROM menu_plans WHERE menu_id = ?", (menu_id,))
     if not plan:
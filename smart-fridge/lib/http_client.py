@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from .circuit_breaker import get_breaker
+
+HTTP_POOL_SIZE = int(os.getenv("SMART_FRIDGE_HTTP_POOL_SIZE", "4"))
+HTTP_MAX_RETRIES = int(os.getenv("SMART_FRIDGE_HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("SMART_FRIDGE_HTTP_BACKOFF", "0.2"))
+RETRY_STATUSES = (502, 503, 504)
+GZIP_MIN_BYTES = 1024
+
+
+class CountingRetry(Retry):
+    """Retry that tags the MaxRetryError it raises with the number of attempts made."""
+
+    def increment(self, *args: Any, **kwargs: Any) -> Retry:
+        try:
+            return super().increment(*args, **kwargs)
+        except MaxRetryError as exc:
+            exc.attempts = len(self.history) + 1
+            raise
+
+
+def _failed_attempts(exc: requests.RequestException) -> int:
+    # requests wraps urllib3's MaxRetryError as the first argument; anything else made one attempt.
+    reason = exc.args[0] if exc.args else None
+    return getattr(reason, "attempts", 1)
+
+
+class HttpClient:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        retry = CountingRetry(
+            total=HTTP_MAX_RETRIES,
+            connect=HTTP_MAX_RETRIES,
+            # A read timeout already cost a full timeout; retrying it would multiply the
+            # wait on a hung endpoint instead of failing fast to the offline fallback.
+            read=0,
+            status=HTTP_MAX_RETRIES,
+            backoff_factor=HTTP_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            # Vision and planner endpoints only compute a response, so POST is safe to repeat.
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breaker = get_breaker(name)
+        # None until the server advertises gzip via Accept-Encoding or rejects it with 415.
+        self.accepts_gzip: Optional[bool] = None
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._attempts = 0
+        self._errors = 0
+        self._total_ms = 0.0
+        self._last_ms = 0.0
+
+    def post(self, url: str, timeout: float, **kwargs: Any) -> Tuple[requests.Response, Dict[str, Any]]:
+        timeout = self.breaker.timeout(timeout)
+        started = time.perf_counter()
+        try:
+            response = self.session.post(url, timeout=timeout, **kwargs)
+        except requests.RequestException as exc:
+            meta = self._record(started, _failed_attempts(exc), True)
+            self.breaker.record_failure()
+            meta["timeout_s"] = round(timeout, 3)
+            meta["circuit"] = self.breaker.state
+            meta["error"] = type(exc).__name__
+            # Providers copy this into meta.http so degraded responses still show the failed call.
+            exc.http_meta = meta
+            raise
+        retries = getattr(response.raw, "retries", None)
+        attempts = len(retries.history) + 1 if retries is not None else 1
+        meta = self._record(started, attempts, response.status_code >= 400)
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success(meta["latency_ms"] / 1000)
+        meta["timeout_s"] = round(timeout, 3)
+        meta["circuit"] = self.breaker.state
+        return response, meta
+
+    def post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        timeout: float,
+        headers: Dict[str, str],
+        compress: str = "auto",
+    ) -> Tuple[requests.Response, Dict[str, Any]]:
+        started = time.perf_counter()
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        use_gzip = (
+            len(body) >= GZIP_MIN_BYTES
+            and self.accepts_gzip is not False
+            and (compress == "always" or (compress == "auto" and self.accepts_gzip))
+        )
+        wire = gzip.compress(body, compresslevel=5) if use_gzip else body
+        encode_ms = (time.perf_counter() - started) * 1000
+        send_headers = {**headers, "Content-Type": "application/json"}
+        if use_gzip:
+            send_headers["Content-Encoding"] = "gzip"
+        response, meta = self.post(url, timeout=timeout, headers=send_headers, data=wire)
+        if use_gzip and response.status_code == 415:
+            self.accepts_gzip = False
+            use_gzip = False
+            wire = body
+            send_headers.pop("Content-Encoding", None)
+            response, meta = self.post(url, timeout=timeout, headers=send_headers, data=wire)
+        if self.accepts_gzip is None and "gzip" in response.headers.get("Accept-Encoding", "").lower():
+            self.accepts_gzip = True
+        meta.update(
+            {
+                "payload_bytes": len(body),
+                "wire_bytes": len(wire),
+                "content_encoding": "gzip" if use_gzip else "identity",
+                "encode_ms": round(encode_ms, 2),
+            }
+        )
+        return response, meta
+
+    def _record(self, started: float, attempts: int, failed: bool) -> Dict[str, Any]:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._requests += 1
+            self._attempts += attempts
+            self._errors += 1 if failed else 0
+            self._total_ms += elapsed_ms
+            self._last_ms = elapsed_ms
+        return {"client": self.name, "attempts": attempts, "latency_ms": round(elapsed_ms, 2)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "attempts": self._attempts,
+                "retries": self._attempts - self._requests,
+                "errors": self._errors,
+                "avg_latency_ms": round(self._total_ms / self._requests, 2) if self._requests else 0.0,
+                "last_latency_ms": round(self._last_ms, 2),
+            }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_clients: Dict[str, HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str) -> HttpClient:
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = HttpClient(name)
+            _clients[name] = client
+        return client
+
+
+def client_stats(name: Optional[str] = None) -> Dict[str, Any]:
+    if name is not None:
+        client = _clients.get(name)
+        return client.stats() if client else {}
+    return {key: client.stats() for key, client in list(_clients.items())}
+
+
+def close_clients() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import heapq
+import time
 import uuid
 from datetime import date, timedelta
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from . import db
-from .utils import format_date, from_json, now_ts, sum_by_key, today
+import numpy as np
+
+from . import db, parallel_scoring
+from .catalog import get_catalog
+from .scoring import BONUS_WEIGHT, COVERAGE_WEIGHT, GAP_WEIGHT, top_k_rows
+from .utils import format_date, today
 
 
 def _inventory_map(batches: List[Dict[str, Any]]) -> Dict[int, float]:
@@ -17,14 +23,19 @@ def _inventory_map(batches: List[Dict[str, Any]]) -> Dict[int, float]:
     return inv
 
 
-def _expiring_bonus(recipe_items: List[Dict[str, Any]], batches: List[Dict[str, Any]]) -> float:
-    bonus = 0.0
-    for ing in recipe_items:
-        for batch in batches:
-            if batch.get("item_id") == ing["item_id"] and batch.get("expire_date"):
-                days_left = (date.fromisoformat(batch["expire_date"]) - today()).days
-                if days_left <= 3:
-                    bonus += max(0, 3 - days_left)
+EXPIRING_WINDOW_DAYS = 3
+DEFAULT_SEARCH_BUDGET_MS = 200
+
+
+def _expiry_bonus(batches: List[Dict[str, Any]], window: int = EXPIRING_WINDOW_DAYS) -> Dict[int, float]:
+    reference = today()
+    bonus: Dict[int, float] = {}
+    for batch in batches:
+        if not batch.get("item_id") or not batch.get("expire_date"):
+            continue
+        days_left = (date.fromisoformat(batch["expire_date"]) - reference).days
+        if days_left <= window:
+            bonus[batch["item_id"]] = bonus.get(batch["item_id"], 0.0) + max(0, window - days_left)
     return bonus
 
 
@@ -44,58 +55,306 @@ def _coverage(recipe_items: List[Dict[str, Any]], inventory: Dict[int, float]) -
     return coverage, gaps
 
 
-def generate_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
-    recipes = db.list_recipes()
-    recipe_ings = db.list_recipe_ingredients()
+def _planning_context(constraints: Dict[str, Any]) -> Dict[str, Any]:
+    catalog = get_catalog()
     batches = db.list_batches({"status": "in_stock"})
     inventory = _inventory_map(batches)
-    allergens_exclude = set(constraints.get("allergens_exclude") or [])
+    expiry_bonus = _expiry_bonus(batches)
     prefer_expiring = bool(constraints.get("prefer_expiring", True))
+    rows = catalog.rows_from_bits(catalog.constraint_bits(constraints))
+
+    matrix = catalog.matrix
+    bonus_vec = matrix.item_vector(expiry_bonus) if prefer_expiring else None
+    return {
+        "catalog": catalog,
+        "inventory": inventory,
+        "prefer_expiring": prefer_expiring,
+        "rows": rows,
+        "inventory_vec": matrix.item_vector(inventory),
+        "bonus_vec": bonus_vec,
+    }
+
+
+def _scores(ctx: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    if "scores" not in ctx:
+        ctx["scores"] = ctx["catalog"].matrix.score(ctx["inventory_vec"], ctx["bonus_vec"])
+    return ctx["scores"]
+
+
+def _top_rows(ctx: Dict[str, Any], k: int) -> List[Tuple[float, int, float]]:
+    catalog = ctx["catalog"]
+    allowed = ctx["rows"]
+    if parallel_scoring.should_parallelize(len(catalog.recipe_ids)) and "scores" not in ctx:
+        mask = None
+        if len(allowed) < len(catalog.recipe_ids):
+            mask = np.zeros(len(catalog.recipe_ids), dtype=bool)
+            mask[allowed] = True
+        return parallel_scoring.top_k(catalog, ctx["inventory_vec"], ctx["bonus_vec"], mask, k)
+    result = _scores(ctx)
+    best = top_k_rows(result["score"], allowed, k)
+    return [(float(result["score"][row]), int(row), float(result["bonus"][row])) for row in best]
+
+
+def _select_greedy(ctx: Dict[str, Any], slots: int) -> List[Dict[str, Any]]:
+    catalog = ctx["catalog"]
+    selections = []
+    for _, row, bonus in _top_rows(ctx, max(1, slots)):
+        recipe_id = catalog.recipe_ids[row]
+        coverage, gaps = _coverage(catalog.recipe_map.get(recipe_id, []), ctx["inventory"])
+        selections.append(
+            {
+                "recipe_id": recipe_id,
+                "coverage": coverage,
+                "gaps": gaps,
+                "bonus": bonus,
+            }
+        )
+    return selections
+
+
+def _deplete(recipe_items: List[Dict[str, Any]], inventory: Dict[int, float]) -> None:
+    for ing in recipe_items:
+        have = inventory.get(ing["item_id"], 0)
+        inventory[ing["item_id"]] = max(0.0, have - float(ing["quantity"]))
+
+
+def _select_depleting(ctx: Dict[str, Any], slots: int) -> List[Dict[str, Any]]:
+    catalog = ctx["catalog"]
+    result = _scores(ctx)
+    working = dict(ctx["inventory"])
+    heap = [(-float(result["score"][row]), int(row), 0) for row in ctx["rows"]]
+    heapq.heapify(heap)
+    depleted_at: Dict[int, int] = {}
+    selections: List[Dict[str, Any]] = []
+    while heap and len(selections) < max(1, slots):
+        _, row, scored_at = heapq.heappop(heap)
+        recipe_id = catalog.recipe_ids[row]
+        recipe_items = catalog.recipe_map.get(recipe_id, [])
+        bonus = float(result["bonus"][row])
+        coverage, gaps = _coverage(recipe_items, working)
+        if any(depleted_at.get(ing["item_id"], -1) >= scored_at for ing in recipe_items):
+            score = coverage * COVERAGE_WEIGHT + bonus * BONUS_WEIGHT - sum(gaps.values()) * GAP_WEIGHT
+            heapq.heappush(heap, (-score, row, len(selections)))
+            continue
+        selections.append({"recipe_id": recipe_id, "coverage": coverage, "gaps": gaps, "bonus": bonus})
+        _deplete(recipe_items, working)
+        for ing in recipe_items:
+            depleted_at[ing["item_id"]] = len(selections) - 1
+    return selections
+
+
+def _plan_value(catalog: Any, selections: List[Dict[str, Any]], inventory: Dict[int, float]) -> float:
+    working = dict(inventory)
+    value = 0.0
+    for selection in selections:
+        recipe_items = catalog.recipe_map.get(selection["recipe_id"], [])
+        coverage, gaps = _coverage(recipe_items, working)
+        value += coverage * COVERAGE_WEIGHT + selection["bonus"] * BONUS_WEIGHT - sum(gaps.values()) * GAP_WEIGHT
+        _deplete(recipe_items, working)
+    return value
+
+
+def _select_branch_and_bound(
+    ctx: Dict[str, Any],
+    slots: int,
+    budget_ms: float,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    # Depletion makes plan value order-dependent, so the search runs over ordered slot
+    # assignments. A recipe's static (full-inventory) score bounds its score in any slot.
+    started = time.perf_counter()
+    deadline = started + max(0.0, budget_ms) / 1000.0
+    catalog = ctx["catalog"]
+    result = _scores(ctx)
+    allowed = ctx["rows"]
+    candidates = [int(row) for row in allowed[np.argsort(-result["score"][allowed], kind="stable")]]
+    static = [float(result["score"][row]) for row in candidates]
+    target = min(max(1, slots), len(candidates))
+
+    incumbent = _select_depleting(ctx, target)
+    best_value = _plan_value(catalog, incumbent, ctx["inventory"])
+    best_rows: Optional[List[int]] = None
+    working = dict(ctx["inventory"])
+    chosen: List[int] = []
+    used = [False] * len(candidates)
+    stats = {"nodes": 0, "timed_out": False, "pending_bound": float("-inf")}
+
+    def top_unused(count: int) -> float:
+        total = 0.0
+        for pos, value in enumerate(static):
+            if count == 0:
+                break
+            if not used[pos]:
+                total += value
+                count -= 1
+        return total
 
-    recipe_map: Dict[int, List[Dict[str, Any]]] = {}
-    for ing in recipe_ings:
-        recipe_map.setdefault(ing["recipe_id"], []).append(ing)
+    def search(value: float) -> None:
+        nonlocal best_value, best_rows
+        if len(chosen) == target:
+            if value > best_value + 1e-9:
+                best_value = value
+                best_rows = list(chosen)
+            return
+        need = target - len(chosen)
+        rest = top_unused(need - 1)
+        for pos in range(len(candidates)):
+            if used[pos]:
+                continue
+            # static is sorted, so this bound only shrinks as pos advances.
+            bound = value + static[pos] + rest
+            if bound <= best_value + 1e-9:
+                break
+            if stats["timed_out"] or time.perf_counter() > deadline:
+                stats["timed_out"] = True
+                stats["pending_bound"] = max(stats["pending_bound"], bound)
+                break
+            stats["nodes"] += 1
+            row = candidates[pos]
+            recipe_items = catalog.recipe_map.get(catalog.recipe_ids[row], [])
+            coverage, gaps = _coverage(recipe_items, working)
+            score = (
+                coverage * COVERAGE_WEIGHT
+                + float(result["bonus"][row]) * BONUS_WEIGHT
+                - sum(gaps.values()) * GAP_WEIGHT
+            )
+            previous = {ing["item_id"]: working.get(ing["item_id"], 0) for ing in recipe_items}
+            _deplete(recipe_items, working)
+            used[pos] = True
+            chosen.append(row)
+            search(value + score)
+            chosen.pop()
+            used[pos] = False
+            for item_id, qty in previous.items():
+                working[item_id] = qty
 
-    scored: List[Tuple[int, float, Dict[int, float], List[str]]] = []
-    for recipe in recipes:
-        allergens = set(filter(None, (recipe.get("allergens") or "").split(",")))
-        if allergens_exclude and allergens_exclude.intersection(allergens):
+    if target > 0:
+        search(0.0)
+
+    if best_rows is None:
+        selections = incumbent
+    else:
+        selections = []
+        working = dict(ctx["inventory"])
+        for row in best_rows:
+            recipe_id = catalog.recipe_ids[row]
+            recipe_items = catalog.recipe_map.get(recipe_id, [])
+            coverage, gaps = _coverage(recipe_items, working)
+            selections.append(
+                {"recipe_id": recipe_id, "coverage": coverage, "gaps": gaps, "bonus": float(result["bonus"][row])}
+            )
+            _deplete(recipe_items, working)
+
+    upper_bound = max(best_value, stats["pending_bound"]) if stats["timed_out"] else best_value
+    meta = {
+        "space": "ordered_slots",
+        "nodes": stats["nodes"],
+        "optimal": not stats["timed_out"],
+        "objective": round(best_value, 4),
+        "upper_bound": round(upper_bound, 4),
+        "bound_gap": round(upper_bound - best_value, 4),
+        "improved_on_greedy": best_rows is not None,
+        "budget_ms": budget_ms,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    return selections, meta
+
+
+def _explain(selection: Dict[str, Any]) -> List[str]:
+    return [
+        f"覆盖率 {selection['coverage']:.0%}，缺口较小" if selection["gaps"] else "库存覆盖率高",
+        "包含临期批次，加速消耗" if selection["bonus"] > 0 else "使用常备食材",
+    ]
+
+
+def plan_requirements(ingredients: Iterable[Dict[str, Any]], servings: Optional[int]) -> Dict[int, float]:
+    # Same quantities cook_plan_item deducts: required ingredients scaled by the menu's servings.
+    scale = max(1, int(servings or 1))
+    need: Dict[int, float] = {}
+    for ing in ingredients:
+        if ing.get("optional") or ing.get("item_id") is None:
             continue
-        recipe_items = recipe_map.get(recipe["recipe_id"], [])
-        coverage, gaps = _coverage(recipe_items, inventory)
-        bonus = _expiring_bonus(recipe_items, batches) if prefer_expiring else 0.0
-        score = coverage + bonus * 0.2 - sum_by_key(
-            [
-                {"gap": gap}
-                for gap in gaps.values()
-            ],
-            "gap",
-        ) * 0.05
-        explain = [
-            f"覆盖率 {coverage:.0%}，缺口较小" if gaps else "库存覆盖率高",
-            "包含临期批次，加速消耗" if bonus > 0 else "使用常备食材",
-        ]
-        scored.append((recipe["recipe_id"], score, gaps, explain))
-
-    scored.sort(key=lambda x: x[1], reverse=True)
+        need[ing["item_id"]] = need.get(ing["item_id"], 0.0) + float(ing["quantity"]) * scale
+    return need
+
+
+def shopping_gaps(need: Dict[int, float], inventory: Dict[int, float]) -> Dict[int, float]:
+    return {
+        item_id: qty - inventory.get(item_id, 0.0)
+        for item_id, qty in need.items()
+        if qty > inventory.get(item_id, 0.0)
+    }
 
+
+def shopping_item(menu_id: str, item: Dict[str, Any], gap: float, source: str) -> Dict[str, Any]:
+    return {
+        "id": f"shop_{uuid.uuid4().hex[:8]}",
+        "menu_id": menu_id,
+        "item_id": item["item_id"],
+        "item_name_snapshot": item["name"],
+        "need_qty": round(gap, 1),
+        "unit": item.get("default_unit") or "unit",
+        "reason": {"gap": gap, "source": source},
+        "checked": False,
+    }
+
+
+def refresh_shopping_gaps(uow: db.UnitOfWork, item_ids: Iterable[Optional[int]]) -> int:
+    ids = sorted({item_id for item_id in item_ids if item_id is not None})
+    if not ids:
+        return 0
+    uow.flush()
+    reference = format_date(today())
+    ingredients: Dict[str, List[Dict[str, Any]]] = {}
+    servings: Dict[str, int] = {}
+    for row in uow.open_plan_ingredients(ids, reference):
+        ingredients.setdefault(row["menu_id"], []).append(row)
+        servings[row["menu_id"]] = row["servings"]
+    have = uow.stock_by_item(ids)
+    existing: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+    for row in uow.open_shopping_items(ids, reference):
+        existing.setdefault((row["menu_id"], row["item_id"]), []).append(row)
+    items = uow.items_by_id(ids)
+
+    updates: List[Tuple[float, Dict[str, Any], str]] = []
+    inserts: List[Dict[str, Any]] = []
+    deletes: List[str] = []
+    for menu_id, rows in ingredients.items():
+        gaps = shopping_gaps(plan_requirements(rows, servings[menu_id]), have)
+        for item_id, gap in gaps.items():
+            current = existing.pop((menu_id, item_id), [])
+            if current:
+                # An unchanged quantity keeps its row (and the reason it was created with).
+                if current[0]["need_qty"] != round(gap, 1):
+                    updates.append((round(gap, 1), {"gap": gap, "source": "inventory_change"}, current[0]["id"]))
+                deletes.extend(row["id"] for row in current[1:])
+            elif item_id in items:
+                inserts.append(shopping_item(menu_id, items[item_id], gap, "inventory_change"))
+    for rows in existing.values():
+        deletes.extend(row["id"] for row in rows)
+
+    uow.update_shopping_items(updates)
+    uow.add_shopping_items(inserts)
+    uow.delete_shopping_items(deletes)
+    return len(updates) + len(inserts) + len(deletes)
+
+
+def _draft_plan(
+    days: int,
+    servings: int,
+    constraints: Dict[str, Any],
+    selections: List[Dict[str, Any]],
+    source: str,
+    inventory: Dict[int, float],
+) -> Dict[str, Any]:
+    catalog = get_catalog()
     menu_id = f"menu_{uuid.uuid4().hex[:8]}"
-    db.insert_menu_plan(menu_id, days, servings, constraints)
 
     plan_items = []
-    shopping_gap: Dict[int, float] = {}
-    used_recipes = set()
-    total_slots = max(1, min(days * 2, len(scored)))
     day_cursor = today()
     meal_types = ["lunch", "dinner"]
-    idx = 0
-    for _ in range(total_slots):
-        while idx < len(scored) and scored[idx][0] in used_recipes:
-            idx += 1
-        if idx >= len(scored):
-            break
-        recipe_id, _, gaps, explain = scored[idx]
-        used_recipes.add(recipe_id)
+    for selection in selections:
+        recipe_id = selection["recipe_id"]
+        coverage, _ = _coverage(catalog.recipe_map.get(recipe_id, []), inventory)
         date_str = format_date(day_cursor)
         meal_type = meal_types[len(plan_items) % len(meal_types)]
         plan_items.append(
@@ -105,45 +364,171 @@ def generate_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict
                 "date": date_str,
                 "meal_type": meal_type,
                 "recipe_id": recipe_id,
-                "explain": explain,
-                "nutrition": from_json(
-                    next((r["nutrition_json"] for r in recipes if r["recipe_id"] == recipe_id), "{}"),
-                    {},
-                ),
+                "explain": _explain(selection),
+                "nutrition": dict(catalog.nutrition.get(recipe_id, {})),
+                "coverage": round(coverage, 4),
             }
         )
-        for item_id, gap in gaps.items():
-            shopping_gap[item_id] = shopping_gap.get(item_id, 0) + gap
         if len(plan_items) % len(meal_types) == 0:
             day_cursor = day_cursor + timedelta(days=1)
-        idx += 1
 
-    db.insert_menu_plan_items(plan_items)
+    need = plan_requirements(
+        (ing for selection in selections for ing in catalog.recipe_map.get(selection["recipe_id"], [])), servings
+    )
+    shopping_items = [
+        shopping_item(menu_id, catalog.items[item_id], gap, source)
+        for item_id, gap in shopping_gaps(need, inventory).items()
+        if item_id in catalog.items
+    ]
 
-    items = {item["item_id"]: item for item in db.list_items()}
-    shopping_items = []
-    for item_id, gap in shopping_gap.items():
-        item = items.get(item_id)
-        if not item:
-            continue
-        shopping_items.append(
-            {
-                "id": f"shop_{uuid.uuid4().hex[:8]}",
-                "menu_id": menu_id,
-                "item_id": item_id,
-                "item_name_snapshot": item["name"],
-                "need_qty": round(gap, 1),
-                "unit": item.get("default_unit") or "unit",
-                "reason": {"gap": gap, "source": "menu_engine"},
-                "checked": False,
+    return {
+        "menu_id": menu_id,
+        "days": days,
+        "servings": servings,
+        "constraints": constraints,
+        "plan": plan_items,
+        "shopping_gap": shopping_items,
+    }
+
+
+def save_plan(draft: Dict[str, Any]) -> Dict[str, Any]:
+    db.insert_menu_plan(draft["menu_id"], draft["days"], draft["servings"], draft["constraints"])
+    db.insert_menu_plan_items(draft["plan"])
+    if draft["shopping_gap"]:
+        db.insert_shopping_items(draft["shopping_gap"])
+    result = {
+        "menu_id": draft["menu_id"],
+        "plan": draft["plan"],
+        "shopping_gap": draft["shopping_gap"],
+    }
+    if draft.get("meta"):
+        result["meta"] = draft["meta"]
+    return result
+
+
+def plan_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+    ctx = _planning_context(constraints)
+    selections = _select_greedy(ctx, days * 2)
+    return _draft_plan(days, servings, constraints, selections, source="menu_engine", inventory=ctx["inventory"])
+
+
+def plan_menu_depleting(days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+    ctx = _planning_context(constraints)
+    selections = _select_depleting(ctx, days * 2)
+    return _draft_plan(days, servings, constraints, selections, source="menu_engine_depleting", inventory=ctx["inventory"])
+
+
+def plan_menu_bnb(
+    days: int,
+    servings: int,
+    constraints: Dict[str, Any],
+    time_budget_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    ctx = _planning_context(constraints)
+    budget_ms = float(time_budget_ms if time_budget_ms is not None else DEFAULT_SEARCH_BUDGET_MS)
+    selections, search_meta = _select_branch_and_bound(ctx, days * 2, budget_ms)
+    draft = _draft_plan(days, servings, constraints, selections, source="menu_engine_bnb", inventory=ctx["inventory"])
+    return {**draft, "meta": {"search": search_meta}}
+
+
+def generate_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+    return save_plan(plan_menu(days, servings, constraints))
+
+
+def _plan_order(item: Dict[str, Any]) -> Tuple[str, int]:
+    meal_types = ["lunch", "dinner"]
+    meal_type = item["meal_type"]
+    return item["date"], meal_types.index(meal_type) if meal_type in meal_types else len(meal_types)
+
+
+def repair_menu(menu_id: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    menu = db.get_menu(menu_id)
+    if not menu:
+        return {}
+    ctx = _planning_context(menu.get("constraints") or {})
+    catalog = ctx["catalog"]
+    inventory = ctx["inventory"]
+    reference = format_date(today())
+    open_items = sorted(
+        (item for item in menu["items"] if not item.get("cooked_at") and item["date"] >= reference),
+        key=_plan_order,
+    )
+
+    lost = []
+    working = dict(inventory)
+    for item in open_items:
+        recipe_items = catalog.recipe_map.get(item["recipe_id"], [])
+        coverage, _ = _coverage(recipe_items, inventory)
+        # Stored coverage is rounded to 4 places, so compare at the same precision.
+        if item.get("coverage") is not None and round(coverage, 4) < float(item["coverage"]):
+            lost.append((item, coverage))
+        else:
+            _deplete(recipe_items, working)
+
+    # Fill lost slots in plan order: each slot is rescored against the stock left after the
+    # slots before it, and whichever recipe ends up in the slot is deducted before the next.
+    replacements = []
+    planned = [catalog.recipe_index[item["recipe_id"]] for item in menu["items"] if item["recipe_id"] in catalog.recipe_index]
+    for item, coverage in lost:
+        recipe_items = catalog.recipe_map.get(item["recipe_id"], [])
+        current, _ = _coverage(recipe_items, working)
+        rows = ctx["rows"][~np.isin(ctx["rows"], planned)]
+        selection = None
+        if len(rows):
+            slot_ctx = {
+                **ctx,
+                "inventory": working,
+                "inventory_vec": catalog.matrix.item_vector(working),
+                "rows": rows,
             }
-        )
+            slot_ctx.pop("scores", None)
+            best = _select_greedy(slot_ctx, 1)
+            if best and best[0]["coverage"] > current:
+                selection = best[0]
+        if selection is None:
+            _deplete(recipe_items, working)
+            continue
+        _deplete(catalog.recipe_map.get(selection["recipe_id"], []), working)
+        planned.append(catalog.recipe_index[selection["recipe_id"]])
+        replacements.append((item, coverage, selection))
 
-    if shopping_items:
-        db.insert_shopping_items(shopping_items)
+    repaired = []
+    if replacements:
+        touched = set()
+        with db.transaction() as uow:
+            for item, coverage, selection in replacements:
+                recipe_id = selection["recipe_id"]
+                new_coverage, _ = _coverage(catalog.recipe_map.get(recipe_id, []), inventory)
+                uow.replace_plan_item(
+                    item["id"],
+                    recipe_id,
+                    _explain(selection),
+                    dict(catalog.nutrition.get(recipe_id, {})),
+                    round(new_coverage, 4),
+                )
+                for ing in catalog.recipe_map.get(item["recipe_id"], []) + catalog.recipe_map.get(recipe_id, []):
+                    touched.add(ing["item_id"])
+                repaired.append(
+                    {
+                        "plan_item_id": item["id"],
+                        "date": item["date"],
+                        "meal_type": item["meal_type"],
+                        "old_recipe_id": item["recipe_id"],
+                        "new_recipe_id": recipe_id,
+                        "coverage_before": round(coverage, 4),
+                        "coverage_after": round(new_coverage, 4),
+                    }
+                )
+            refresh_shopping_gaps(uow, touched)
 
     return {
         "menu_id": menu_id,
-        "plan": plan_items,
-        "shopping_gap": shopping_items,
+        "repaired": repaired,
+        "meta": {
+            "open_slots": len(open_items),
+            "lost_slots": len(lost),
+            "replaced_slots": len(repaired),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
     }
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .scoring import RecipeMatrix, top_k_rows
+
+PARALLEL_MIN_RECIPES = int(os.getenv("SMART_FRIDGE_PARALLEL_MIN_RECIPES", "100000"))
+SCORING_WORKERS = int(os.getenv("SMART_FRIDGE_SCORING_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_worker_matrix: Optional[RecipeMatrix] = None
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_key: Optional[Tuple[str, int]] = None
+_executor_lock = threading.Lock()
+# In-flight top_k calls per pool; a pool replaced after a catalog change is only
+# shut down once its last caller has collected its shards.
+_executor_users: Dict[ProcessPoolExecutor, int] = {}
+_retired: Set[ProcessPoolExecutor] = set()
+
+
+def _init_worker(arrays: Dict[str, Any]) -> None:
+    global _worker_matrix
+    _worker_matrix = RecipeMatrix.from_arrays(arrays)
+
+
+def _score_shard(
+    start: int,
+    stop: int,
+    inventory: np.ndarray,
+    bonus: Optional[np.ndarray],
+    allowed: Optional[np.ndarray],
+    k: int,
+) -> List[Tuple[float, int, float]]:
+    result = _worker_matrix.score(inventory, bonus, start=start, stop=stop)
+    local = np.arange(stop - start) if allowed is None else np.flatnonzero(allowed)
+    best = top_k_rows(result["score"], local, k)
+    return [(float(result["score"][row]), start + int(row), float(result["bonus"][row])) for row in best]
+
+
+def should_parallelize(n_recipes: int) -> bool:
+    return SCORING_WORKERS > 1 and n_recipes >= PARALLEL_MIN_RECIPES
+
+
+def _retire(executor: ProcessPoolExecutor) -> None:
+    if _executor_users.get(executor, 0) > 0:
+        _retired.add(executor)
+        return
+    _executor_users.pop(executor, None)
+    _retired.discard(executor)
+    executor.shutdown(wait=False, cancel_futures=False)
+
+
+def _acquire_executor(catalog: Any) -> ProcessPoolExecutor:
+    global _executor, _executor_key
+    key = (catalog.path, catalog.version)
+    with _executor_lock:
+        if _executor is None or _executor_key != key:
+            if _executor is not None:
+                _retire(_executor)
+            _executor = ProcessPoolExecutor(
+                max_workers=SCORING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(catalog.matrix.to_arrays(),),
+            )
+            _executor_key = key
+        _executor_users[_executor] = _executor_users.get(_executor, 0) + 1
+        return _executor
+
+
+def _release_executor(executor: ProcessPoolExecutor) -> None:
+    with _executor_lock:
+        _executor_users[executor] = _executor_users.get(executor, 1) - 1
+        if executor in _retired:
+            _retire(executor)
+
+
+def top_k(
+    catalog: Any,
+    inventory: np.ndarray,
+    bonus: Optional[np.ndarray],
+    allowed: Optional[np.ndarray],
+    k: int,
+) -> List[Tuple[float, int, float]]:
+    n_recipes = len(catalog.recipe_ids)
+    executor = _acquire_executor(catalog)
+    try:
+        shard_size = -(-n_recipes // SCORING_WORKERS)
+        futures = [
+            executor.submit(
+                _score_shard,
+                start,
+                min(start + shard_size, n_recipes),
+                inventory,
+                bonus,
+                None if allowed is None else allowed[start : start + shard_size],
+                k,
+            )
+            for start in range(0, n_recipes, shard_size)
+        ]
+        merged: List[Tuple[float, int, float]] = []
+        for future in futures:
+            merged.extend(future.result())
+    finally:
+        _release_executor(executor)
+    return heapq.nlargest(k, merged, key=lambda entry: (entry[0], -entry[1]))
+
+
+def shutdown() -> None:
+    global _executor, _executor_key
+    with _executor_lock:
+        for executor in [*_retired, *([_executor] if _executor is not None else [])]:
+            executor.shutdown(wait=True, cancel_futures=True)
+        _executor_users.clear()
+        _retired.clear()
+        _executor = None
+        _executor_key = None
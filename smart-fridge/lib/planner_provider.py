@@ -2,15 +2,23 @@ from __future__ import annotations
 
 import json
 import os
+import threading
+import time
 import uuid
 from datetime import timedelta
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 import requests
 
 from . import db
-from .menu_engine import generate_menu as greedy_generate_menu
-from .utils import format_date, from_json, now_ts, sum_by_key, today
+from .cache import ResponseCache, SqliteCache, TTLCache
+from .catalog import CompiledCatalog, get_catalog
+from .http_client import get_client
+from .menu_engine import plan_menu, plan_menu_bnb, plan_menu_depleting, save_plan
+from .menu_engine import plan_requirements, shopping_gaps, shopping_item
+from .scoring import top_k_rows
+from .utils import format_date, now_ts, today
 
 
 class ProviderNotAvailable(Exception):
@@ -20,6 +28,34 @@ class ProviderNotAvailable(Exception):
         self.reason = reason
 
 
+PLANNER_CACHE_SIZE = int(os.getenv("PLANNER_HTTP_CACHE_SIZE", "64"))
+PLANNER_CACHE_TTL = float(os.getenv("PLANNER_HTTP_CACHE_TTL", "900"))
+PLANNER_CACHE_PATH = os.getenv("PLANNER_HTTP_CACHE_PATH", "")
+PLANNER_CACHE_DISK_MAX = int(os.getenv("PLANNER_HTTP_CACHE_DISK_MAX", "1000"))
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is not None:
+        return _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            disk = (
+                SqliteCache(PLANNER_CACHE_PATH, PLANNER_CACHE_DISK_MAX, PLANNER_CACHE_TTL)
+                if PLANNER_CACHE_PATH
+                else None
+            )
+            _response_cache = ResponseCache(TTLCache(PLANNER_CACHE_SIZE, PLANNER_CACHE_TTL), disk)
+        return _response_cache
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    return get_response_cache().stats()
+
+
 def _inventory_map(batches: List[Dict[str, Any]]) -> Dict[int, float]:
     inv: Dict[int, float] = {}
     for batch in batches:
@@ -29,22 +65,6 @@ def _inventory_map(batches: List[Dict[str, Any]]) -> Dict[int, float]:
     return inv
 
 
-def _coverage(recipe_items: List[Dict[str, Any]], inventory: Dict[int, float]) -> Tuple[float, Dict[int, float]]:
-    if not recipe_items:
-        return 0.0, {}
-    covered = 0
-    gaps: Dict[int, float] = {}
-    for ing in recipe_items:
-        need = float(ing["quantity"])
-        have = inventory.get(ing["item_id"], 0)
-        if have >= need:
-            covered += 1
-        else:
-            gaps[ing["item_id"]] = need - have
-    coverage = covered / len(recipe_items)
-    return coverage, gaps
-
-
 class GreedyPlannerProvider:
     id = "greedy"
     name = "Greedy (Offline)"
@@ -52,8 +72,42 @@ class GreedyPlannerProvider:
     def is_available(self) -> tuple[bool, str]:
         return True, ""
 
+    def plan(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+        return plan_menu(days, servings, constraints)
+
+    def generate(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+        return save_plan(self.plan(days, servings, constraints))
+
+
+class DepletingGreedyPlannerProvider:
+    id = "greedy_depleting"
+    name = "Greedy + 库存扣减 (Offline)"
+
+    def is_available(self) -> tuple[bool, str]:
+        return True, ""
+
+    def plan(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+        return plan_menu_depleting(days, servings, constraints)
+
     def generate(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
-        return greedy_generate_menu(days, servings, constraints)
+        return save_plan(self.plan(days, servings, constraints))
+
+
+class BranchAndBoundPlannerProvider:
+    id = "bnb"
+    name = "Branch & Bound (Offline, 限时)"
+
+    def is_available(self) -> tuple[bool, str]:
+        return True, ""
+
+    def __init__(self, time_budget_ms: Optional[float] = None) -> None:
+        self.time_budget_ms = time_budget_ms
+
+    def plan(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+        return plan_menu_bnb(days, servings, constraints, self.time_budget_ms)
+
+    def generate(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+        return save_plan(self.plan(days, servings, constraints))
 
 
 class HttpPlannerProvider:
@@ -65,6 +119,10 @@ class HttpPlannerProvider:
         self.headers_json = os.getenv("PLANNER_HTTP_HEADERS_JSON", "")
         timeout = os.getenv("PLANNER_HTTP_TIMEOUT", "20")
         self.timeout = int(timeout) if timeout.isdigit() else 20
+        self.wire_format = os.getenv("PLANNER_HTTP_WIRE_FORMAT", "full").lower()
+        self.gzip_mode = os.getenv("PLANNER_HTTP_GZIP", "auto").lower()
+        self.client = get_client("planner_http")
+        self.http_meta: Dict[str, Any] = {}
 
     def is_available(self) -> tuple[bool, str]:
         if not self.endpoint:
@@ -81,32 +139,70 @@ class HttpPlannerProvider:
         except json.JSONDecodeError as exc:
             raise ProviderNotAvailable("PROVIDER_CONFIG_ERROR", f"Invalid PLANNER_HTTP_HEADERS_JSON: {exc}") from exc
 
+    def _candidate_rows(
+        self,
+        inventory: Dict[int, float],
+        catalog: CompiledCatalog,
+        constraints: Dict[str, Any],
+        top_k: int,
+    ) -> np.ndarray:
+        matrix = catalog.matrix
+        scores = matrix.score(matrix.item_vector(inventory))["score"]
+        allowed = catalog.rows_from_bits(catalog.constraint_bits(constraints))
+        return np.sort(top_k_rows(scores, allowed, top_k))
+
+    def _build_compact_payload(
+        self,
+        stock: List[Dict[str, Any]],
+        inventory: Dict[int, float],
+        catalog: CompiledCatalog,
+        constraints: Dict[str, Any],
+        top_k: int,
+    ) -> Dict[str, Any]:
+        item_ids = {row["item_id"] for row in stock}
+        candidates = []
+        for row in self._candidate_rows(inventory, catalog, constraints, top_k):
+            recipe = catalog.recipes[row]
+            ingredients = []
+            for ing in catalog.recipe_map.get(recipe["recipe_id"], []):
+                item_ids.add(ing["item_id"])
+                default_unit = catalog.items.get(ing["item_id"], {}).get("default_unit")
+                entry = [ing["item_id"], ing["quantity"]]
+                if ing["unit"] != default_unit:
+                    entry.append(ing["unit"])
+                ingredients.append(entry)
+            candidates.append(
+                {
+                    "recipe_id": recipe["recipe_id"],
+                    "name": recipe["name"],
+                    "allergens": recipe.get("allergens") or "",
+                    "ingredients": ingredients,
+                }
+            )
+        items = {}
+        for item_id in sorted(item_ids):
+            item = catalog.items.get(item_id, {})
+            items[str(item_id)] = [item.get("name") or str(item_id), item.get("default_unit") or "unit"]
+        return {
+            "format": "compact/v1",
+            "items": items,
+            "inventory": [[row["item_id"], row["quantity"], row["earliest_expire"]] for row in stock],
+            "candidates": candidates,
+        }
+
     def _build_candidates(
         self,
         inventory: Dict[int, float],
-        recipe_map: Dict[int, List[Dict[str, Any]]],
-        recipes: List[Dict[str, Any]],
+        catalog: CompiledCatalog,
+        constraints: Dict[str, Any],
         top_k: int,
     ) -> List[Dict[str, Any]]:
-        scored: List[Tuple[int, float]] = []
-        for recipe in recipes:
-            items = recipe_map.get(recipe["recipe_id"], [])
-            coverage, gaps = _coverage(items, inventory)
-            score = coverage - sum_by_key(
-                [{"gap": gap} for gap in gaps.values()],
-                "gap",
-            ) * 0.05
-            scored.append((recipe["recipe_id"], score))
-        scored.sort(key=lambda x: x[1], reverse=True)
-        selected = {recipe_id for recipe_id, _ in scored[:top_k]}
         candidates = []
-        items_lookup = {item["item_id"]: item for item in db.list_items()}
-        for recipe in recipes:
-            if recipe["recipe_id"] not in selected:
-                continue
+        for row in self._candidate_rows(inventory, catalog, constraints, top_k):
+            recipe = catalog.recipes[row]
             ingredients = []
-            for ing in recipe_map.get(recipe["recipe_id"], []):
-                item = items_lookup.get(ing["item_id"], {})
+            for ing in catalog.recipe_map.get(recipe["recipe_id"], []):
+                item = catalog.items.get(ing["item_id"], {})
                 ingredients.append(
                     {
                         "item_id": ing["item_id"],
@@ -139,34 +235,28 @@ class HttpPlannerProvider:
             )
         return inventory
 
-    def _calculate_gap(
+    def _recipe_coverage(
         self,
         recipe_ids: List[int],
-        recipe_map: Dict[int, List[Dict[str, Any]]],
+        catalog: CompiledCatalog,
         inventory: Dict[int, float],
     ) -> Dict[int, float]:
-        gap: Dict[int, float] = {}
-        for recipe_id in recipe_ids:
-            for ing in recipe_map.get(recipe_id, []):
-                need = float(ing["quantity"])
-                have = inventory.get(ing["item_id"], 0)
-                if have < need:
-                    gap[ing["item_id"]] = gap.get(ing["item_id"], 0) + (need - have)
-        return gap
+        coverage = catalog.matrix.score(catalog.matrix.item_vector(inventory))["coverage"]
+        return {recipe_id: round(float(coverage[catalog.recipe_index[recipe_id]]), 4) for recipe_id in recipe_ids}
 
     def _build_plan_items(
         self,
         menu_id: str,
         recipe_ids: List[int],
         explain_map: Dict[int, List[str]],
-        recipes: Dict[int, Dict[str, Any]],
+        nutrition: Dict[int, Dict[str, Any]],
+        coverage: Dict[int, float],
         days: int,
     ) -> List[Dict[str, Any]]:
         plan_items = []
         day_cursor = today()
         meal_types = ["lunch", "dinner"]
         for idx, recipe_id in enumerate(recipe_ids[: max(1, days * 2)]):
-            recipe = recipes.get(recipe_id, {})
             plan_items.append(
                 {
                     "id": f"mpi_{uuid.uuid4().hex[:8]}",
@@ -175,7 +265,8 @@ class HttpPlannerProvider:
                     "meal_type": meal_types[idx % len(meal_types)],
                     "recipe_id": recipe_id,
                     "explain": explain_map.get(recipe_id, ["基于外部 planner 推荐", "适配当前库存情况"]),
-                    "nutrition": from_json(recipe.get("nutrition_json"), {}),
+                    "nutrition": dict(nutrition.get(recipe_id, {})),
+                    "coverage": coverage.get(recipe_id),
                 }
             )
             if (idx + 1) % len(meal_types) == 0:
@@ -207,39 +298,65 @@ class HttpPlannerProvider:
             )
         return shopping_items
 
-    def generate(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+    def plan(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
         available, reason = self.is_available()
         if not available:
             raise ProviderNotAvailable("PROVIDER_NOT_AVAILABLE", reason)
 
-        recipes = db.list_recipes()
-        recipe_map: Dict[int, List[Dict[str, Any]]] = {}
-        for ing in db.list_recipe_ingredients():
-            recipe_map.setdefault(ing["recipe_id"], []).append(ing)
-        batches = db.list_batches({"status": "in_stock"})
-        inventory_map = _inventory_map(batches)
-
-        payload = {
-            "days": days,
-            "servings": servings,
-            "constraints": constraints,
-            "inventory": self._build_inventory(batches),
-            "candidates": self._build_candidates(inventory_map, recipe_map, recipes, top_k=10),
-            "top_k": 10,
-        }
-        response = requests.post(
-            self.endpoint,
-            headers=self._headers(),
-            json=payload,
-            timeout=self.timeout,
-        )
-        response.raise_for_status()
-        data = response.json()
-        selected = data.get("selected")
-        if not isinstance(selected, list) or not selected:
-            raise ProviderNotAvailable("PROVIDER_RESPONSE_INVALID", "Response missing selected list")
-
-        recipe_lookup = {recipe["recipe_id"]: recipe for recipe in recipes}
+        catalog = get_catalog()
+        recipe_map = catalog.recipe_map
+        payload: Dict[str, Any] = {"days": days, "servings": servings, "constraints": constraints, "top_k": 10}
+        if self.wire_format == "compact":
+            stock = db.inventory_by_item()
+            inventory_map = {row["item_id"]: float(row["quantity"]) for row in stock}
+            payload.update(self._build_compact_payload(stock, inventory_map, catalog, constraints, top_k=10))
+        else:
+            batches = db.list_batches({"status": "in_stock"})
+            inventory_map = _inventory_map(batches)
+            payload["inventory"] = self._build_inventory(batches)
+            payload["candidates"] = self._build_candidates(inventory_map, catalog, constraints, top_k=10)
+        headers = self._headers()
+
+        def fetch() -> Dict[str, Any]:
+            try:
+                response, call = self.client.post_json(
+                    self.endpoint,
+                    payload,
+                    timeout=self.timeout,
+                    headers=headers,
+                    compress=self.gzip_mode,
+                )
+            except requests.RequestException as exc:
+                self.http_meta = {**getattr(exc, "http_meta", {}), "cache": "remote", "totals": self.client.stats()}
+                raise
+            # Kept on the provider so a degraded response can still report the failed call.
+            self.http_meta = {**call, "cache": "remote", "totals": self.client.stats()}
+            response.raise_for_status()
+            data = response.json()
+            selected = data.get("selected")
+            if not isinstance(selected, list) or not selected:
+                raise ProviderNotAvailable("PROVIDER_RESPONSE_INVALID", "Response missing selected list")
+            return {"data": data, "call": call}
+
+        started = time.perf_counter()
+        if PLANNER_CACHE_SIZE > 0 and PLANNER_CACHE_TTL > 0:
+            cache = get_response_cache()
+            cache_key = cache.key(self.endpoint, headers, format_date(today()), payload)
+            entry, source = cache.get_or_fetch(cache_key, fetch)
+        else:
+            entry, source = fetch(), "bypass"
+        if source in ("remote", "bypass"):
+            call = {**entry["call"], "cache": source}
+        else:
+            call = {
+                "client": self.client.name,
+                "attempts": 0,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                "cache": source,
+            }
+        selected = entry["data"]["selected"]
+
+        recipe_lookup = catalog.recipe_lookup
         recipe_ids: List[int] = []
         explain_map: Dict[int, List[str]] = {}
         for entry in selected:
@@ -256,29 +373,44 @@ class HttpPlannerProvider:
             raise ProviderNotAvailable("PROVIDER_RESPONSE_INVALID", "No valid recipe_id in selected list")
 
         menu_id = f"menu_{uuid.uuid4().hex[:8]}"
-        db.insert_menu_plan(menu_id, days, servings, constraints)
 
         plan_items = self._build_plan_items(
             menu_id=menu_id,
             recipe_ids=recipe_ids,
             explain_map=explain_map,
-            recipes=recipe_lookup,
+            nutrition=catalog.nutrition,
+            coverage=self._recipe_coverage(recipe_ids, catalog, inventory_map),
             days=days,
         )
-        db.insert_menu_plan_items(plan_items)
 
-        gap = self._calculate_gap(recipe_ids, recipe_map, inventory_map)
-        items_lookup = {item["item_id"]: item for item in db.list_items()}
-        shopping_items = self._build_shopping_items(menu_id, gap, items_lookup)
-        if shopping_items:
-            db.insert_shopping_items(shopping_items)
+        need = plan_requirements(
+            (ing for item in plan_items for ing in recipe_map.get(item["recipe_id"], [])), servings
+        )
+        shopping_items = [
+            shopping_item(menu_id, catalog.items[item_id], gap, "planner_http")
+            for item_id, gap in shopping_gaps(need, inventory_map).items()
+            if item_id in catalog.items
+        ]
+
+        return {
+            "menu_id": menu_id,
+            "days": days,
+            "servings": servings,
+            "constraints": constraints,
+            "plan": plan_items,
+            "shopping_gap": shopping_items,
+            "meta": {"http": {**call, "totals": self.client.stats()}},
+        }
 
-        return {"menu_id": menu_id, "plan": plan_items, "shopping_gap": shopping_items}
+    def generate(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+        return save_plan(self.plan(days, servings, constraints))
 
 
 def list_planners() -> Dict[str, object]:
     return {
         GreedyPlannerProvider.id: GreedyPlannerProvider(),
+        DepletingGreedyPlannerProvider.id: DepletingGreedyPlannerProvider(),
+        BranchAndBoundPlannerProvider.id: BranchAndBoundPlannerProvider(),
         HttpPlannerProvider.id: HttpPlannerProvider(),
     }
 
@@ -291,4 +423,7 @@ def get_planner(name: str):
     available, reason = planner.is_available()
     if not available:
         raise ProviderNotAvailable("PROVIDER_NOT_AVAILABLE", reason)
+    client = getattr(planner, "client", None)
+    if client is not None and not client.breaker.allow():
+        raise ProviderNotAvailable("PROVIDER_CIRCUIT_OPEN", f"Planner '{name}' circuit is open, using offline fallback")
     return planner
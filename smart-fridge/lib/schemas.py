@@ -78,6 +78,8 @@ class MenuPlanItem:
     recipe_id: int
     explain: List[str]
     nutrition: Optional[Dict[str, Any]]
+    cooked_at: Optional[str] = None
+    coverage: Optional[float] = None
 
 
 @dataclass
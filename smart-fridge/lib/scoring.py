@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+COVERAGE_WEIGHT = 1.0
+BONUS_WEIGHT = 0.2
+GAP_WEIGHT = 0.05
+
+
+class RecipeMatrix:
+    """Sparse recipe x item requirement matrix stored as COO arrays.
+
+    Rows follow ``recipe_ids``; columns follow ``item_ids``. Each recipe is
+    expected to list an item at most once, as ``recipe_ingredients`` does.
+    """
+
+    def __init__(self, recipe_ids: List[int], recipe_map: Dict[int, List[Dict[str, Any]]]) -> None:
+        self.recipe_ids = list(recipe_ids)
+        self.item_ids = sorted(
+            {ing["item_id"] for recipe_id in self.recipe_ids for ing in recipe_map.get(recipe_id, [])}
+        )
+        self.item_index = {item_id: col for col, item_id in enumerate(self.item_ids)}
+        rows: List[int] = []
+        cols: List[int] = []
+        qty: List[float] = []
+        for row, recipe_id in enumerate(self.recipe_ids):
+            for ing in recipe_map.get(recipe_id, []):
+                rows.append(row)
+                cols.append(self.item_index[ing["item_id"]])
+                qty.append(float(ing["quantity"]))
+        self._set_arrays(
+            np.asarray(rows, dtype=np.int64),
+            np.asarray(cols, dtype=np.int64),
+            np.asarray(qty, dtype=np.float64),
+        )
+
+    def _set_arrays(self, rows: np.ndarray, cols: np.ndarray, qty: np.ndarray) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.qty = qty
+        self.counts = np.bincount(self.rows, minlength=len(self.recipe_ids))
+        self.row_ptr = np.concatenate(([0], np.cumsum(self.counts))).astype(np.int64)
+
+    def to_arrays(self) -> Dict[str, Any]:
+        return {
+            "recipe_ids": self.recipe_ids,
+            "item_ids": self.item_ids,
+            "rows": self.rows,
+            "cols": self.cols,
+            "qty": self.qty,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, Any]) -> "RecipeMatrix":
+        matrix = cls.__new__(cls)
+        matrix.recipe_ids = list(arrays["recipe_ids"])
+        matrix.item_ids = list(arrays["item_ids"])
+        matrix.item_index = {item_id: col for col, item_id in enumerate(matrix.item_ids)}
+        matrix._set_arrays(arrays["rows"], arrays["cols"], arrays["qty"])
+        return matrix
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.recipe_ids), len(self.item_ids)
+
+    def item_vector(self, values: Dict[int, float]) -> np.ndarray:
+        vec = np.zeros(len(self.item_ids), dtype=np.float64)
+        for item_id, value in values.items():
+            col = self.item_index.get(item_id)
+            if col is not None:
+                vec[col] = value
+        return vec
+
+    def score(
+        self,
+        inventory: np.ndarray,
+        bonus: Optional[np.ndarray] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        stop = len(self.recipe_ids) if stop is None else stop
+        n_recipes = stop - start
+        lo, hi = self.row_ptr[start], self.row_ptr[stop]
+        rows = self.rows[lo:hi] - start
+        cols = self.cols[lo:hi]
+        qty = self.qty[lo:hi]
+        counts = self.counts[start:stop]
+        have = inventory[cols]
+        covered = have >= qty
+        gap = np.where(covered, 0.0, qty - have)
+        covered_count = np.bincount(rows, weights=covered.astype(np.float64), minlength=n_recipes)
+        coverage = np.divide(
+            covered_count,
+            counts,
+            out=np.zeros(n_recipes, dtype=np.float64),
+            where=counts > 0,
+        )
+        gap_total = np.bincount(rows, weights=gap, minlength=n_recipes)
+        if bonus is None:
+            bonus_total = np.zeros(n_recipes, dtype=np.float64)
+        else:
+            bonus_total = np.bincount(rows, weights=bonus[cols], minlength=n_recipes)
+        score = coverage * COVERAGE_WEIGHT + bonus_total * BONUS_WEIGHT - gap_total * GAP_WEIGHT
+        return {
+            "coverage": coverage,
+            "gap_total": gap_total,
+            "bonus": bonus_total,
+            "score": score,
+        }
+
+
+def top_k_rows(scores: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+    if k <= 0 or len(rows) == 0:
+        return rows[:0]
+    values = scores[rows]
+    if k < len(rows):
+        keep = np.argpartition(-values, k - 1)[:k]
+        kth = values[keep].min()
+        above = np.flatnonzero(values > kth)
+        ties = np.flatnonzero(values == kth)[: k - len(above)]
+        picked = np.sort(np.concatenate((above, ties)))
+    else:
+        picked = np.arange(len(rows))
+    picked = picked[np.argsort(-values[picked], kind="stable")]
+    return rows[picked]
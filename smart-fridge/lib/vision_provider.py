@@ -9,6 +9,7 @@ from typing import Any, Dict, List
 import requests
 
 from . import db
+from .http_client import get_client
 from .utils import add_days, format_date, stable_hash, today
 
 
@@ -76,6 +77,8 @@ class HttpVisionProvider(BaseVisionProvider):
         self.headers_json = os.getenv("VISION_HTTP_HEADERS_JSON", "")
         timeout = os.getenv("VISION_HTTP_TIMEOUT", "20")
         self.timeout = int(timeout) if timeout.isdigit() else 20
+        self.client = get_client("vision_http")
+        self.http_meta: Dict[str, Any] = {}
 
     def is_available(self) -> tuple[bool, str]:
         if not self.endpoint:
@@ -105,12 +108,17 @@ class HttpVisionProvider(BaseVisionProvider):
         with open(file_path, "rb") as file_handle:
             image_base64 = base64.b64encode(file_handle.read()).decode("utf-8")
         payload = {"image_id": image_id, "image_base64": image_base64, "top_k": top_k}
-        response = requests.post(
-            self.endpoint,
-            headers=self._headers(),
-            json=payload,
-            timeout=self.timeout,
-        )
+        try:
+            response, call = self.client.post(
+                self.endpoint,
+                headers=self._headers(),
+                json=payload,
+                timeout=self.timeout,
+            )
+        except requests.RequestException as exc:
+            self.http_meta = {**getattr(exc, "http_meta", {}), "totals": self.client.stats()}
+            raise
+        self.http_meta = {**call, "totals": self.client.stats()}
         response.raise_for_status()
         data = response.json()
         detections = data.get("detections", [])
@@ -156,4 +164,7 @@ def get_provider(name: str) -> BaseVisionProvider:
     available, reason = provider.is_available()
     if not available:
         raise ProviderNotAvailable("PROVIDER_NOT_AVAILABLE", reason)
+    client = getattr(provider, "client", None)
+    if client is not None and not client.breaker.allow():
+        raise ProviderNotAvailable("PROVIDER_CIRCUIT_OPEN", f"Provider '{name}' circuit is open, using offline fallback")
     return provider
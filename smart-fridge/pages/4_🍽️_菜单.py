@@ -19,31 +19,49 @@ with st.sidebar:
     prefer_expiring = st.toggle("优先消耗临期", value=True)
     diet = st.selectbox("饮食偏好", options=["balanced", "high_protein", "low_fat"], index=0)
     allergens = st.multiselect("排除过敏原", options=["egg", "dairy", "nuts"])
+    tags = st.multiselect("偏好标签", options=api.list_recipe_tags())
     planner = st.selectbox(
         "菜单生成方式",
-        options=["greedy", "http"],
+        options=["greedy", "greedy_depleting", "bnb", "http"],
         index=0,
         help="http 需配置 PLANNER_HTTP_ENDPOINT",
     )
+    hedged = st.toggle("同时计算 greedy 兜底", value=False, disabled=planner == "greedy")
+    deadline_ms = st.slider("等待远程结果上限 (ms)", min_value=100, max_value=5000, value=1000, step=100, disabled=not hedged)
 
 constraints = {
     "prefer_expiring": prefer_expiring,
     "diet": diet,
     "allergens_exclude": allergens,
+    "tags": tags,
 }
 
 if st.button("生成菜单", type="primary"):
-    result = api.generate_menu(days, servings, constraints, planner=planner)
+    result = api.generate_menu(
+        days,
+        servings,
+        constraints,
+        planner=planner,
+        deadline_ms=deadline_ms if hedged and planner != "greedy" else None,
+    )
     st.session_state.last_menu_id = result["menu_id"]
     meta = result.get("meta", {})
     if meta.get("degraded"):
         st.warning(f"已降级为 {meta.get('planner_used')}：{meta.get('reason')}")
+    if meta.get("cache") == "hit":
+        st.info("库存与条件未变化，已复用最近生成的菜单。")
     st.success("已生成菜单，可下滑查看详情。")
 
 if st.session_state.last_menu_id:
     menu = api.get_menu(st.session_state.last_menu_id)
     recipes = {r["recipe_id"]: r for r in db.list_recipes()}
     st.markdown("### 菜单计划")
+    if st.button("按当前库存修复菜单"):
+        repaired = api.repair_menu(st.session_state.last_menu_id)
+        if repaired.get("repaired"):
+            st.success(f"已替换 {len(repaired['repaired'])} 道覆盖率下降的菜品，其余保持不变。")
+        else:
+            st.info("当前菜单无需调整。")
     for item in menu.get("items", []):
         recipe = recipes.get(item["recipe_id"], {"name": "未知菜谱"})
         with st.expander(f"{item['date']} · {item['meal_type']} · {recipe['name']}"):
@@ -56,6 +74,14 @@ if st.session_state.last_menu_id:
                 st.json(nutrition)
             else:
                 st.info("未提供营养信息（MVP）")
+            if item.get("cooked_at"):
+                st.caption(f"已烹饪：{item['cooked_at']}")
+            elif st.button("标记已烹饪（扣减库存）", key=f"cook_{item['id']}"):
+                cooked = api.cook_plan_item(item["id"])
+                if cooked.get("shortfall"):
+                    missing = "、".join(f"{s['item_name']} {s['need_qty']}{s['unit']}" for s in cooked["shortfall"])
+                    st.warning(f"库存不足：{missing}")
+                st.success("已扣减库存并记录消耗事件")
 
     st.page_link("pages/5_🧾_购物清单.py", label="生成/查看购物清单", icon="🧾")
 else:
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from lib import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "smart_fridge.db")
+    db.init_db()
+    yield db.DB_PATH
+    db.close_connections()
+
+
+@pytest.fixture
+def seeded_db(temp_db):
+    from db.seed import seed
+
+    seed()
+    return temp_db
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from lib import api
+from lib.circuit_breaker import get_breaker
+from lib.http_client import HTTP_MAX_RETRIES, HttpClient
+
+
+class StubServer:
+    """Local endpoint that answers POSTs from a script of (status, delay_s, body) steps."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                step = stub.script[min(stub.hits, len(stub.script) - 1)]
+                stub.hits += 1
+                status, delay, body = step
+                time.sleep(delay)
+                payload = json.dumps(body).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except OSError:
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/predict"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def client(request):
+    name = f"test_{request.node.name}"
+    get_breaker(name).reset()
+    client = HttpClient(name)
+    yield client
+    client.close()
+    get_breaker(name).reset()
+
+
+def test_retries_502_then_succeeds(client):
+    with StubServer([(502, 0, {}), (200, 0, {"ok": True})]) as stub:
+        response, meta = client.post(stub.url, timeout=2, json={})
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
+    assert stub.hits == 2
+    assert meta["attempts"] == 2
+    assert client.stats()["retries"] == 1
+
+
+def test_read_timeout_is_not_retried(client):
+    with StubServer([(200, 1.0, {"ok": True})]) as stub:
+        with pytest.raises(requests.RequestException) as info:
+            client.post(stub.url, timeout=0.2, json={})
+        hits = stub.hits
+    assert hits == 1
+    assert info.value.http_meta["attempts"] == 1
+    assert client.stats()["attempts"] == 1
+    assert client.stats()["errors"] == 1
+
+
+def test_connect_errors_count_every_attempt(client):
+    with StubServer([(200, 0, {})]) as stub:
+        url = stub.url
+    with pytest.raises(requests.ConnectionError) as info:
+        client.post(url, timeout=1, json={})
+    assert info.value.http_meta["attempts"] == HTTP_MAX_RETRIES + 1
+    assert client.stats()["retries"] == HTTP_MAX_RETRIES
+
+
+def test_degraded_planner_keeps_http_meta(seeded_db, monkeypatch):
+    get_breaker("planner_http").reset()
+    with StubServer([(500, 0, {"error": "boom"})]) as stub:
+        monkeypatch.setenv("PLANNER_HTTP_ENDPOINT", stub.url)
+        result = api.generate_menu(1, 2, {}, planner="http", use_cache=False)
+    get_breaker("planner_http").reset()
+    meta = result["meta"]
+    assert meta["degraded"] and meta["planner_used"] == "greedy"
+    assert meta["http"]["client"] == "planner_http"
+    assert meta["http"]["attempts"] == 1
+    assert meta["http"]["totals"]["errors"] >= 1
+
+
+def test_degraded_vision_keeps_http_meta(temp_db, tmp_path, monkeypatch):
+    get_breaker("vision_http").reset()
+    image = tmp_path / "fridge.jpg"
+    image.write_bytes(b"\xff\xd8\xff")
+    api.db.upsert_image("img_test", str(image))
+    with StubServer([(500, 0, {"error": "boom"})]) as stub:
+        monkeypatch.setenv("VISION_HTTP_ENDPOINT", stub.url)
+        result = api.detect("img_test", provider="http")
+    get_breaker("vision_http").reset()
+    meta = result["meta"]
+    assert meta["degraded"] and meta["provider_used"] == "mock"
+    assert meta["http"]["client"] == "vision_http"
+    assert meta["http"]["attempts"] == 1
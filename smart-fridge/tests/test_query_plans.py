@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, List, Tuple
+
+import pytest
+
+from lib import db
+
+FULL_SCAN = "SCAN inventory_batches"
+TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+
+
+@pytest.fixture
+def captured(temp_db, monkeypatch) -> List[Tuple[str, Tuple[Any, ...]]]:
+    queries: List[Tuple[str, Tuple[Any, ...]]] = []
+    fetch_all, fetch_one = db.fetch_all, db.fetch_one
+
+    def record_all(query: str, params: Iterable[Any] = ()):
+        queries.append((query, tuple(params)))
+        return fetch_all(query, params)
+
+    def record_one(query: str, params: Iterable[Any] = ()):
+        queries.append((query, tuple(params)))
+        return fetch_one(query, params)
+
+    monkeypatch.setattr(db, "fetch_all", record_all)
+    monkeypatch.setattr(db, "fetch_one", record_one)
+    return queries
+
+
+def query_plan(query: str, params: Tuple[Any, ...]) -> List[str]:
+    with db.get_connection() as conn:
+        return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+@pytest.mark.parametrize(
+    "call",
+    [
+        lambda: db.list_batches({"status": "in_stock"}),
+        lambda: db.list_batches({"location": "fridge"}),
+        lambda: db.list_batches({"status": "in_stock", "location": "fridge"}),
+        lambda: db.list_batch_events("batch_1"),
+        lambda: db.list_events(10),
+        lambda: db.list_expiring(3),
+        lambda: db.count_expiring(3),
+        lambda: db.get_menu("menu_1"),
+        lambda: db.list_shopping_items("menu_1"),
+    ],
+    ids=[
+        "list_batches_status",
+        "list_batches_location",
+        "list_batches_status_location",
+        "list_batch_events",
+        "list_events",
+        "list_expiring",
+        "count_expiring",
+        "get_menu",
+        "list_shopping_items",
+    ],
+)
+def test_hot_queries_use_indexes(captured, call):
+    call()
+    assert captured
+    for query, params in captured:
+        plan = query_plan(query, params)
+        assert not any(step.startswith(FULL_SCAN) for step in plan), plan
+        assert not any(TEMP_SORT in step for step in plan), plan
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import random
+
+import numpy as np
+
+from lib.menu_engine import _coverage
+from lib.scoring import BONUS_WEIGHT, COVERAGE_WEIGHT, GAP_WEIGHT, RecipeMatrix
+
+
+def random_catalog(seed: int, recipes: int = 400, items: int = 60):
+    rng = random.Random(seed)
+    recipe_map = {
+        recipe_id: [
+            {"item_id": item_id, "quantity": rng.choice([0.5, 1, 2, 3, 150])}
+            for item_id in rng.sample(range(1, items + 1), rng.randint(0, 6))
+        ]
+        for recipe_id in range(1, recipes + 1)
+    }
+    inventory = {item_id: float(rng.randint(0, 4)) for item_id in rng.sample(range(1, items + 1), items // 2)}
+    bonus = {item_id: float(rng.randint(0, 3)) for item_id in rng.sample(range(1, items + 1), items // 4)}
+    return recipe_map, inventory, bonus
+
+
+def test_score_matches_per_recipe_reference():
+    for seed in range(5):
+        recipe_map, inventory, bonus = random_catalog(seed)
+        matrix = RecipeMatrix(list(recipe_map), recipe_map)
+        result = matrix.score(matrix.item_vector(inventory), matrix.item_vector(bonus))
+        for row, recipe_id in enumerate(matrix.recipe_ids):
+            items = recipe_map[recipe_id]
+            coverage, gaps = _coverage(items, inventory)
+            recipe_bonus = sum(bonus.get(ing["item_id"], 0.0) for ing in items)
+            gap_total = sum(gaps.values())
+            score = coverage * COVERAGE_WEIGHT + recipe_bonus * BONUS_WEIGHT - gap_total * GAP_WEIGHT
+            assert abs(result["coverage"][row] - coverage) <= 1e-9
+            assert abs(result["gap_total"][row] - gap_total) <= 1e-9
+            assert abs(result["bonus"][row] - recipe_bonus) <= 1e-9
+            assert abs(result["score"][row] - score) <= 1e-9
+
+
+def test_score_shards_match_full_score():
+    recipe_map, inventory, bonus = random_catalog(7)
+    matrix = RecipeMatrix(list(recipe_map), recipe_map)
+    inventory_vec, bonus_vec = matrix.item_vector(inventory), matrix.item_vector(bonus)
+    full = matrix.score(inventory_vec, bonus_vec)
+    bounds = [0, 97, 250, len(matrix.recipe_ids)]
+    for key in ("coverage", "gap_total", "bonus", "score"):
+        shards = [matrix.score(inventory_vec, bonus_vec, lo, hi)[key] for lo, hi in zip(bounds, bounds[1:])]
+        np.testing.assert_allclose(np.concatenate(shards), full[key], rtol=0, atol=1e-9)
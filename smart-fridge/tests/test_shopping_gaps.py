@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import pytest
+
+from lib import api, db
+from lib.menu_engine import refresh_shopping_gaps
+
+
+def shopping(menu_id):
+    return {row["item_name_snapshot"]: row["need_qty"] for row in api.get_shopping_list(menu_id)["items"]}
+
+
+def stock_eggs(quantity):
+    egg = db.get_item_by_name("鸡蛋")
+    created = api.bulk_create_batches(
+        {"type": "manual"}, [{"item_id": egg["item_id"], "item_name": "鸡蛋", "quantity": quantity, "unit": "pcs"}]
+    )
+    return created["created"][0]
+
+
+def test_noop_batch_edit_keeps_generated_gaps(seeded_db):
+    batch = stock_eggs(3)
+    menu = api.generate_menu(1, 1, {}, planner="greedy", use_cache=False)
+    before = shopping(menu["menu_id"])
+    # Recipes 1 and 2 each need 2 eggs: 4 needed against 3 in stock.
+    assert before["鸡蛋"] == 1.0
+
+    api.update_batch(batch["batch_id"], {"quantity": 3.0})
+    assert shopping(menu["menu_id"]) == before
+
+
+def test_generated_gaps_scale_with_servings(seeded_db):
+    stock_eggs(3)
+    menu = api.generate_menu(1, 2, {}, planner="greedy", use_cache=False)
+    assert shopping(menu["menu_id"])["鸡蛋"] == 5.0
+
+
+@pytest.mark.parametrize("planner", ["greedy", "greedy_depleting", "bnb"])
+@pytest.mark.parametrize("servings", [1, 3])
+def test_refresh_agrees_with_generation(seeded_db, planner, servings):
+    stock_eggs(5)
+    menu = api.generate_menu(2, servings, {}, planner=planner, use_cache=False)
+    before = api.get_shopping_list(menu["menu_id"])["items"]
+    with db.transaction() as uow:
+        changed = refresh_shopping_gaps(uow, [item["item_id"] for item in db.list_items()])
+    assert changed == 0
+    assert api.get_shopping_list(menu["menu_id"])["items"] == before